@@ -0,0 +1,12 @@
+"""
+Entry point for "python -m backend".
+
+Capture processes are started with spawn, which re-imports the parent's
+main module in every child unless it is a package __main__. Launching
+through this module keeps app.py (torch, Flask, the bot, logging setup)
+out of the capture processes.
+"""
+from backend.app import main
+
+if __name__ == '__main__':
+    main()
@@ -175,7 +175,7 @@ def init_models_api(store, detector, model_manager, video_manager):
                 return jsonify({'error': 'Camera not available'}), 503
             
             # Получить кадр
-            frame = video_manager.get_frame(camera_id)
+            frame = video_manager.get_frame_view(camera_id)
             
             if frame is None:
                 return jsonify({'error': 'No frame available'}), 503
@@ -106,7 +106,7 @@ def init_spots_api(store, state_manager):
             store.save_spots(spots)
             
             # Update space stats
-            state_manager.initialize_space(space_id)
+            state_manager.spot_topology_changed(space_id)
             
             logger.info(f"Created spot: {spot_id} in space {space_id}")
             return jsonify(new_spot), 201
@@ -152,7 +152,7 @@ def init_spots_api(store, state_manager):
             store.save_spots(spots)
             
             # Update space stats
-            state_manager.initialize_space(spot['space_id'])
+            state_manager.spot_topology_changed(spot['space_id'])
             
             logger.info(f"Updated spot: {spot_id}")
             return jsonify(spot), 200
@@ -178,7 +178,7 @@ def init_spots_api(store, state_manager):
             store.save_spots(spots)
             
             # Update space stats
-            state_manager.initialize_space(space_id)
+            state_manager.spot_topology_changed(space_id)
             
             logger.info(f"Deleted spot: {spot_id}")
             return jsonify({'message': 'Spot deleted'}), 200
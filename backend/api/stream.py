@@ -106,7 +106,7 @@ def init_stream_api(store, video_manager, state_manager, detector):
                 _metrics['camera_unavailable'] += 1
                 return _create_placeholder_image("Камера недоступна"), 503
             
-            frame = video_manager.get_frame(camera_id)
+            frame = video_manager.get_frame_view(camera_id)
             
             if frame is None:
                 logger.warning(f"No frame available for camera {camera_id}")
@@ -468,7 +468,7 @@ def init_stream_api(store, video_manager, state_manager, detector):
                         time.sleep(1)
                         continue
                     
-                    frame = video_manager.get_frame(camera_id)
+                    frame = video_manager.get_frame_view(camera_id)
                     
                     if frame is None:
                         time.sleep(0.1)
@@ -521,7 +521,7 @@ def init_stream_api(store, video_manager, state_manager, detector):
                         time.sleep(1)
                         continue
                     
-                    frame = video_manager.get_frame(camera_id)
+                    frame = video_manager.get_frame_view(camera_id)
                     
                     if frame is None:
                         time.sleep(0.1)
@@ -99,11 +99,22 @@ class ParkingMonitorApp:
     
     def __init__(self):
         self.store = JSONStore()
-        self.video_manager = VideoProcessorManager()
+        config = self.store.get_config()
+        
+        # Захват в отдельных процессах имеет смысл только для нескольких камер
+        use_processes = (
+            config.get('capture_processes', False)
+            and len(self.store.get_cameras()) > 1
+        )
+        if use_processes and getattr(sys.modules['__main__'], '__spec__', None) is None:
+            # Запуск файлом: spawn заново выполнил бы app.py (torch, Flask, бот,
+            # логи) в каждом процессе захвата. Через "python -m backend" - нет
+            logger.warning("capture_processes requires starting with 'python -m backend', using capture threads")
+            use_processes = False
+        self.video_manager = VideoProcessorManager(use_processes=use_processes)
         self.model_manager = ModelManager()
         
         # Получить активную модель из конфига или использовать дефолтную
-        config = self.store.get_config()
         active_model = config.get('active_model', 'yolov8n.pt')
         model_path = self.model_manager.get_model_path_for_detector(active_model)
         
@@ -271,12 +282,20 @@ class ParkingMonitorApp:
                         space_camera_spots[key] = []
                     space_camera_spots[key].append(spot)
                 
+                # Run one batched detection over all cameras in use
+                camera_ids = list({camera_id for _, camera_id in space_camera_spots})
+                frames = self.video_manager.get_latest_frames(camera_ids)
+                camera_detections = dict(zip(
+                    frames.keys(),
+                    self.detector.detect_batch(list(frames.values()))
+                ))
+                
                 # Process each camera/space combination
                 detections = {}
                 for (space_id, camera_id), space_spots in space_camera_spots.items():
-                    frame = self.video_manager.get_frame(camera_id)
+                    frame_detections = camera_detections.get(camera_id)
                     
-                    if frame is None:
+                    if frame_detections is None:
                         continue
                     
                     # Prepare ROIs for batch detection
@@ -286,7 +305,7 @@ class ParkingMonitorApp:
                     ]
                     
                     # Detect vehicles in ROIs
-                    spot_detections = self.detector.get_detections_in_rois(frame, rois)
+                    spot_detections = self.detector.match_rois(frame_detections, rois)
                     detections.update(spot_detections)
                 
                 # Update occupancy tracker
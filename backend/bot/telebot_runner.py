@@ -254,7 +254,7 @@ class TelebotRunner:
                     return
                 
                 camera_id = args[1]
-                frame = self.video_manager.get_frame(camera_id)
+                frame = self.video_manager.get_frame_view(camera_id)
                 
                 if frame is None:
                     self.bot.reply_to(message, "Камера недоступна или нет кадра.")
@@ -499,7 +499,7 @@ class TelebotRunner:
                 space['next_spot_number'] = spot_number + 1
                 self.store.save_spaces(spaces)
                 
-                self.state_manager.initialize_space(space_id)
+                self.state_manager.spot_topology_changed(space_id)
                 
                 self.bot.reply_to(message, f"✅ Место добавлено: {spot_id}")
             except Exception as e:
@@ -559,7 +559,7 @@ class TelebotRunner:
                 space_id = spot['space_id']
                 spots = [s for s in spots if s['id'] != spot_id]
                 self.store.save_spots(spots)
-                self.state_manager.initialize_space(space_id)
+                self.state_manager.spot_topology_changed(space_id)
                 
                 self.bot.reply_to(message, "✅ Место удалено")
             except Exception as e:
@@ -958,7 +958,7 @@ class TelebotRunner:
                         self.bot.answer_callback_query(call.id, "Камера не найдена")
                         return
                     
-                    frame = self.video_manager.get_frame(camera_id)
+                    frame = self.video_manager.get_frame_view(camera_id)
                     if frame is None:
                         self.bot.answer_callback_query(call.id, "Камера недоступна")
                         return
@@ -1021,7 +1021,7 @@ class TelebotRunner:
                         self.bot.answer_callback_query(call.id, "Камера не найдена")
                         return
                     
-                    frame = self.video_manager.get_frame(camera_id)
+                    frame = self.video_manager.get_frame_view(camera_id)
                     if frame is None:
                         self.bot.answer_callback_query(call.id, "Камера недоступна")
                         return
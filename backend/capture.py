@@ -0,0 +1,309 @@
+"""
+Camera capture: the threaded capture loop and the capture child process.
+
+Spawned capture processes import only this module, so it depends on cv2,
+numpy and the standard library alone. It lives outside backend.services
+because importing that package loads the YOLO detector.
+"""
+import cv2
+import logging
+import re
+import sys
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Optional
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Сетевые источники: только у них копится буфер устаревших кадров
+NETWORK_URL_PREFIXES = ('rtsp://', 'rtsps://', 'http://', 'https://')
+# FPS, если источник его не сообщает или сообщает явно неверный
+DEFAULT_SOURCE_FPS = 25.0
+MAX_SOURCE_FPS = 120.0
+# grab() дольше этой доли интервала между кадрами означает, что кадр
+# пришёл из сети, а не из буфера (grab() включает и декодирование)
+FRESH_GRAB_FRACTION = 0.5
+# Ограничение на число сбрасываемых за итерацию устаревших кадров
+MAX_STALE_FRAMES = 30
+
+# Аппаратные декодеры H.264 для GStreamer: NVDEC (Jetson) и VAAPI (Intel/AMD)
+NVDEC_DECODER = "nvv4l2decoder ! nvvidconv ! video/x-raw,format=BGRx"
+VAAPI_DECODER = "vaapih264dec ! video/x-raw"
+GSTREAMER_PIPELINE = (
+    "rtspsrc location=\"{url}\" latency=100 ! rtph264depay ! h264parse ! {decoder} ! "
+    "videoconvert ! video/x-raw,format=BGR ! appsink drop=1 max-buffers=1 sync=false"
+)
+
+# Символы, которые нельзя безопасно передать в описание пайплайна gst-launch:
+# пробелы и "!" разделяют элементы, кавычки закрывают значение свойства
+_GST_UNSAFE_URL = re.compile(r'[\s\x00-\x1f!"\']')
+
+_gstreamer_available: Optional[bool] = None
+
+
+def _has_gstreamer() -> bool:
+    """Проверить, собран ли OpenCV с поддержкой GStreamer (результат кэшируется)."""
+    global _gstreamer_available
+    if _gstreamer_available is None:
+        try:
+            build_info = cv2.getBuildInformation()
+            _gstreamer_available = re.search(r'GStreamer:\s*YES', build_info) is not None
+        except Exception:
+            _gstreamer_available = False
+    return _gstreamer_available
+
+
+def _gst_location(url: str) -> Optional[str]:
+    """
+    Prepare an RTSP URL for the rtspsrc location property.
+    
+    Returns None for URLs that cannot be embedded into a pipeline
+    description safely; such cameras go through FFmpeg instead.
+    """
+    if not url.startswith('rtsp://') or _GST_UNSAFE_URL.search(url):
+        return None
+    return url.replace('\\', '\\\\')
+
+
+def _hw_decoder() -> str:
+    """Выбрать аппаратный декодер: NVDEC при наличии CUDA-устройства, иначе VAAPI."""
+    try:
+        if cv2.cuda.getCudaEnabledDeviceCount() > 0:
+            return NVDEC_DECODER
+    except (AttributeError, cv2.error):
+        pass
+    return VAAPI_DECODER
+
+
+class VideoProcessor:
+    """Manages video capture from RTSP streams."""
+    
+    def __init__(self, camera_id: str, rtsp_url: str, hw_decode: bool = True):
+        self.camera_id = camera_id
+        self.rtsp_url = rtsp_url
+        self.hw_decode = hw_decode
+        self.cap: Optional[cv2.VideoCapture] = None
+        self.latest_frame: Optional[np.ndarray] = None
+        self.frame_lock = threading.Lock()
+        self.running = False
+        self.thread: Optional[threading.Thread] = None
+        self.last_frame_time = 0
+        self.fps = 0
+        self.reconnect_delay = 5  # seconds
+        self._is_network = rtsp_url.lower().startswith(NETWORK_URL_PREFIXES)
+        self._frame_interval = 1.0 / DEFAULT_SOURCE_FPS
+        
+    def start(self):
+        """Start video capture thread."""
+        if self.running:
+            logger.warning(f"Video processor for {self.camera_id} already running")
+            return
+        
+        self.running = True
+        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
+        self.thread.start()
+        logger.info(f"Started video processor for camera {self.camera_id}")
+    
+    def stop(self):
+        """Stop video capture thread."""
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=5)
+        if self.cap:
+            self.cap.release()
+        logger.info(f"Stopped video processor for camera {self.camera_id}")
+    
+    def _capture_loop(self):
+        """Main capture loop with auto-reconnect."""
+        while self.running:
+            try:
+                self._connect()
+                while self.running and self.cap and self.cap.isOpened():
+                    ret, frame = self._read_freshest()
+                    
+                    if not ret:
+                        logger.warning(f"Failed to read frame from {self.camera_id}")
+                        break
+                    
+                    self._publish_frame(frame)
+                
+            except Exception as e:
+                logger.error(f"Error in capture loop for {self.camera_id}: {e}")
+            
+            finally:
+                if self.cap:
+                    self.cap.release()
+                    self.cap = None
+            
+            if self.running:
+                logger.info(f"Reconnecting to {self.camera_id} in {self.reconnect_delay}s...")
+                time.sleep(self.reconnect_delay)
+    
+    def _publish_frame(self, frame: np.ndarray):
+        """Make a freshly captured frame available to readers."""
+        # cap.read() каждый раз возвращает новый массив, и поток
+        # захвата его больше не изменяет - копия не нужна
+        with self.frame_lock:
+            self.latest_frame = frame
+            current_time = time.time()
+            if self.last_frame_time > 0:
+                self.fps = 1.0 / (current_time - self.last_frame_time)
+            self.last_frame_time = current_time
+    
+    def _read_freshest(self):
+        """
+        Прочитать самый свежий кадр, пропустив накопившиеся в буфере.
+        
+        Для сетевых потоков grab() блокируется до прихода кадра, поэтому
+        отдельная задержка в цикле не нужна. grab(), вернувшийся быстрее
+        половины интервала между кадрами, означает, что кадр уже лежал
+        в очереди - такие кадры пропускаются без преобразования в BGR.
+        Файлы и локальные устройства читаются по кадру в темпе источника.
+        """
+        if not self._is_network:
+            started = time.monotonic()
+            ret, frame = self.cap.read()
+            delay = self._frame_interval - (time.monotonic() - started)
+            if ret and delay > 0:
+                time.sleep(delay)
+            return ret, frame
+        
+        fresh_grab = self._frame_interval * FRESH_GRAB_FRACTION
+        for _ in range(MAX_STALE_FRAMES):
+            started = time.monotonic()
+            if not self.cap.grab():
+                return False, None
+            if time.monotonic() - started >= fresh_grab:
+                break
+        return self.cap.retrieve()
+    
+    def _source_fps(self) -> float:
+        """FPS, заявленный источником, или DEFAULT_SOURCE_FPS, если он неправдоподобен."""
+        fps = self.cap.get(cv2.CAP_PROP_FPS)
+        if not 1.0 <= fps <= MAX_SOURCE_FPS:
+            return DEFAULT_SOURCE_FPS
+        return fps
+    
+    def _connect(self):
+        """Connect to RTSP stream."""
+        logger.info(f"Connecting to RTSP stream: {self.camera_id}")
+        self.cap = self._open_hw_capture()
+        
+        if self.cap is None:
+            self.cap = cv2.VideoCapture(self.rtsp_url, cv2.CAP_FFMPEG)
+            # Set buffer size to minimize latency
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        
+        if not self.cap.isOpened():
+            raise ConnectionError(f"Failed to open RTSP stream for {self.camera_id}")
+        
+        self._frame_interval = 1.0 / self._source_fps()
+        logger.info(f"Connected to {self.camera_id}")
+    
+    def _open_hw_capture(self) -> Optional[cv2.VideoCapture]:
+        """
+        Открыть RTSP поток через GStreamer с аппаратным декодированием.
+        
+        Returns:
+            Открытый VideoCapture или None, если аппаратный путь недоступен
+        """
+        if not self.hw_decode or not _has_gstreamer():
+            return None
+        
+        location = _gst_location(self.rtsp_url)
+        if location is None:
+            logger.info(f"RTSP URL of {self.camera_id} is not pipeline-safe, using FFmpeg")
+            return None
+        
+        pipeline = GSTREAMER_PIPELINE.format(url=location, decoder=_hw_decoder())
+        cap = cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+        if cap.isOpened():
+            logger.info(f"Using hardware-decoded GStreamer pipeline for {self.camera_id}")
+            return cap
+        
+        cap.release()
+        logger.warning(f"Hardware decoding unavailable for {self.camera_id}, falling back to FFmpeg")
+        return None
+    
+    def get_latest_frame(self) -> Optional[np.ndarray]:
+        """Get the latest captured frame (thread-safe)."""
+        with self.frame_lock:
+            return self.latest_frame.copy() if self.latest_frame is not None else None
+    
+    def get_latest_frame_view(self) -> Optional[np.ndarray]:
+        """
+        Get the latest captured frame without copying.
+        
+        The array is shared with other readers and must not be modified;
+        use get_latest_frame() when a writable copy is needed.
+        """
+        with self.frame_lock:
+            return self.latest_frame
+    
+    def is_alive(self) -> bool:
+        """Check if capture is active and receiving frames."""
+        with self.frame_lock:
+            if self.latest_frame is None:
+                return False
+            # Consider alive if we got a frame in the last 10 seconds
+            return (time.time() - self.last_frame_time) < 10
+
+
+# Размер разделяемого буфера кадра в процессном режиме (хватает на 4K BGR)
+MAX_SHARED_FRAME_BYTES = 3840 * 2160 * 3
+
+# Поля заголовка кадра в разделяемой памяти
+HDR_SEQ, HDR_HEIGHT, HDR_WIDTH, HDR_CHANNELS, HDR_FRAME_TIME, HDR_FPS = range(6)
+HDR_SIZE = 6
+
+# Формат логов процесса захвата - тот же, что у приложения (backend/app.py)
+CHILD_LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class _SharedMemoryPublisher(VideoProcessor):
+    """Capture loop running in a child process that publishes frames into shared memory."""
+    
+    def __init__(self, camera_id: str, rtsp_url: str, hw_decode: bool, shm_name: str, header):
+        super().__init__(camera_id, rtsp_url, hw_decode)
+        self._shm = shared_memory.SharedMemory(name=shm_name)
+        self._header = header
+        self._size_warned = False
+    
+    def _publish_frame(self, frame: np.ndarray):
+        header = self._header
+        if frame.nbytes > self._shm.size:
+            if not self._size_warned:
+                logger.error(f"Frame {frame.shape} from {self.camera_id} does not fit shared buffer")
+                self._size_warned = True
+            return
+        
+        # Нечётный seq - кадр пишется, чётный - готов (seqlock)
+        header[HDR_SEQ] += 1
+        np.ndarray(frame.shape, dtype=np.uint8, buffer=self._shm.buf)[...] = frame
+        current_time = time.time()
+        if header[HDR_FRAME_TIME] > 0:
+            header[HDR_FPS] = 1.0 / (current_time - header[HDR_FRAME_TIME])
+        header[HDR_HEIGHT], header[HDR_WIDTH] = frame.shape[:2]
+        header[HDR_CHANNELS] = frame.shape[2] if frame.ndim == 3 else 1
+        header[HDR_FRAME_TIME] = current_time
+        header[HDR_SEQ] += 1
+    
+    def close(self):
+        self._shm.close()
+
+
+def capture_process_main(camera_id: str, rtsp_url: str, hw_decode: bool,
+                         shm_name: str, header, stop_event):
+    """Entry point of a capture child process."""
+    # app.py в дочернем процессе не выполняется, логирование настраиваем здесь;
+    # только stdout - в logs/parking.log пишет родительский процесс
+    logging.basicConfig(level=logging.INFO, format=CHILD_LOG_FORMAT, stream=sys.stdout)
+    publisher = _SharedMemoryPublisher(camera_id, rtsp_url, hw_decode, shm_name, header)
+    publisher.start()
+    try:
+        stop_event.wait()
+    finally:
+        publisher.stop()
+        publisher.close()
@@ -333,7 +333,7 @@ class AutoMarkupService:
     
     def _analyze_single_frame(self, session: AutoMarkupSession):
         """Быстрый анализ - один кадр."""
-        frame = self.video_manager.get_frame(session.camera_id)
+        frame = self.video_manager.get_frame_view(session.camera_id)
         
         if frame is None:
             raise RuntimeError("Camera not available")
@@ -369,7 +369,7 @@ class AutoMarkupService:
             if session.status == 'cancelled':
                 return
             
-            frame = self.video_manager.get_frame(session.camera_id)
+            frame = self.video_manager.get_frame_view(session.camera_id)
             
             if frame is not None:
                 # Сохранить последний кадр для превью
@@ -408,7 +408,7 @@ class AutoMarkupService:
             if session.status == 'cancelled':
                 return
             
-            frame = self.video_manager.get_frame(session.camera_id)
+            frame = self.video_manager.get_frame_view(session.camera_id)
             
             if frame is not None:
                 session.preview_frame = frame.copy()
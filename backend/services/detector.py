@@ -41,6 +41,7 @@ class Detector:
         self.confidence_threshold = confidence_threshold
         self.model = None
         self.model_loaded_at = None
+        self._vehicle_ids = frozenset()
         self._lazy_load()
     
     def _lazy_load(self):
@@ -51,14 +52,39 @@ class Detector:
         
         try:
             logger.info(f"Loading YOLO model from {self.model_path}")
-            self.model = YOLO(self.model_path)
+            self.model = self._prepare_model(YOLO(self.model_path))
+            self._vehicle_ids = self._build_vehicle_ids(self.model)
             self.model_loaded_at = datetime.now()
             logger.info(f"YOLO model loaded successfully: {self.model_path}")
         except Exception as e:
             logger.error(f"Failed to load YOLO model {self.model_path}: {e}", exc_info=True)
             self.model = None
+            self._vehicle_ids = frozenset()
             self.model_loaded_at = None
     
+    def _build_vehicle_ids(self, model) -> frozenset:
+        """Собрать множество id классов модели, относящихся к транспорту."""
+        vehicle_classes = {c.lower() for c in self.VEHICLE_CLASSES}
+        return frozenset(
+            class_id for class_id, name in model.names.items()
+            if name.lower() in vehicle_classes
+        )
+    
+    def _prepare_model(self, model):
+        """
+        Подготовить загруженную модель к инференсу.
+        
+        Сливает Conv+BN в одну операцию. torch.compile не используется:
+        predictor ultralytics строит AutoBackend из eager-модуля (fuse()
+        скомпилированного модуля возвращает исходный), а при переменном
+        размере пакета компиляция повторяется прямо в цикле детекции.
+        """
+        try:
+            model.model.fuse()
+        except Exception as e:
+            logger.warning(f"Failed to fuse model layers: {e}")
+        return model
+    
     def change_model(self, new_model_path: str) -> bool:
         """
         Сменить модель YOLO.
@@ -80,10 +106,11 @@ class Detector:
             logger.info(f"Changing YOLO model from {self.model_path} to {new_model_path}")
             
             # Загрузить новую модель (переменная окружения уже установлена)
-            new_model = YOLO(new_model_path)
+            new_model = self._prepare_model(YOLO(new_model_path))
             
             # Если успешно, заменить
             self.model = new_model
+            self._vehicle_ids = self._build_vehicle_ids(new_model)
             self.model_path = new_model_path
             self.model_loaded_at = datetime.now()
             
@@ -158,32 +185,7 @@ class Detector:
             
             detections = []
             for result in results:
-                boxes = result.boxes
-                for box in boxes:
-                    # Get class name
-                    class_id = int(box.cls[0])
-                    class_name = self.model.names[class_id]
-                    
-                    # Filter only vehicles
-                    if class_name.lower() not in self.VEHICLE_CLASSES:
-                        continue
-                    
-                    # Get bbox and confidence
-                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy()
-                    confidence = float(box.conf[0])
-                    
-                    detection = Detection(
-                        bbox=(int(x1), int(y1), int(x2), int(y2)),
-                        confidence=confidence,
-                        class_name=class_name
-                    )
-                    
-                    # Фильтровать детекции в exclusion zones
-                    if exclusion_zones:
-                        if self._is_in_exclusion_zone(detection.bbox, exclusion_zones):
-                            continue
-                    
-                    detections.append(detection)
+                detections.extend(self._parse_result(result, exclusion_zones))
             
             return detections
         
@@ -191,6 +193,59 @@ class Detector:
             logger.error(f"Error during detection: {e}")
             return []
     
+    def detect_batch(self, frames: List[np.ndarray]) -> List[List[Detection]]:
+        """
+        Detect vehicles in several frames with a single batched forward pass.
+        
+        Args:
+            frames: List of input images (BGR format)
+        
+        Returns:
+            List of detection lists, one per input frame
+        """
+        if self.model is None or not YOLO_AVAILABLE or not frames:
+            return [[] for _ in frames]
+        
+        try:
+            results = self.model(frames, conf=self.confidence_threshold, verbose=False)
+            return [self._parse_result(result) for result in results]
+        
+        except Exception as e:
+            logger.error(f"Error during batch detection: {e}")
+            return [[] for _ in frames]
+    
+    def _parse_result(self, result, 
+                      exclusion_zones: Optional[List[Dict[str, int]]] = None) -> List[Detection]:
+        """Convert one YOLO result into vehicle detections."""
+        boxes = result.boxes
+        
+        # Одна пересылка GPU->CPU на тензор вместо синхронизации на каждый бокс
+        xyxy = boxes.xyxy.cpu().numpy().astype(np.int32)
+        confs = boxes.conf.cpu().numpy()
+        clses = boxes.cls.cpu().numpy().astype(np.int32)
+        names = result.names
+        
+        detections = []
+        for (x1, y1, x2, y2), confidence, class_id in zip(xyxy.tolist(), confs.tolist(), clses.tolist()):
+            # Filter only vehicles
+            if class_id not in self._vehicle_ids:
+                continue
+            
+            detection = Detection(
+                bbox=(x1, y1, x2, y2),
+                confidence=confidence,
+                class_name=names[class_id]
+            )
+            
+            # Фильтровать детекции в exclusion zones
+            if exclusion_zones:
+                if self._is_in_exclusion_zone(detection.bbox, exclusion_zones):
+                    continue
+            
+            detections.append(detection)
+        
+        return detections
+    
     def _is_in_exclusion_zone(self, bbox: Tuple[int, int, int, int], 
                               exclusion_zones: List[Dict[str, int]]) -> bool:
         """
@@ -303,6 +358,20 @@ class Detector:
             Dictionary mapping roi_id to detection status
         """
         detections = self.detect(frame)
+        return self.match_rois(detections, rois)
+    
+    def match_rois(self, detections: List[Detection], 
+                   rois: List[Dict]) -> Dict[str, bool]:
+        """
+        Match already computed detections against ROIs.
+        
+        Args:
+            detections: Detections for the frame the ROIs belong to
+            rois: List of ROI dictionaries with 'id' and coordinates
+        
+        Returns:
+            Dictionary mapping roi_id to detection status
+        """
         results = {}
         
         for roi in rois:
@@ -1,13 +1,18 @@
 """
 Менеджер для автоматической загрузки и управления FFmpeg.
 """
+import hashlib
 import logging
 import os
 import platform
 import shutil
 import subprocess
+import tempfile
+import threading
+import time
 import zipfile
 import tarfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 import requests
@@ -28,6 +33,34 @@ FFMPEG_URLS = {
 }
 
 
+# Время жизни кэша результата find_ffmpeg (секунды)
+FFMPEG_CACHE_TTL = 60
+
+# Архивы меньше этого размера скачиваются в память, большие - во временный файл
+SPOOL_MAX_SIZE = 256 << 20
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+# Параллельные Range-запросы при загрузке и число попыток докачки каждой части
+DOWNLOAD_PARTS = 4
+PART_RETRIES = 3
+
+
+def _throttle_progress(progress_callback):
+    """Обернуть callback прогресса так, чтобы он вызывался не чаще раза на 1%."""
+    if progress_callback is None:
+        return None
+    
+    last_reported = -1
+    
+    def report(progress: float):
+        nonlocal last_reported
+        percent = int(progress)
+        if percent > last_reported:
+            last_reported = percent
+            progress_callback(percent)
+    
+    return report
+
+
 class FFmpegManager:
     """Менеджер для автоматической загрузки и управления FFmpeg."""
     
@@ -47,13 +80,38 @@ class FFmpegManager:
         self.system = platform.system()
         self.machine = platform.machine()
         
+        # Кэш результата поиска и проверки FFmpeg
+        self._cached_path: Optional[str] = None
+        self._cached_at: Optional[float] = None
+        self._verified_path: Optional[str] = None
+        self.version: Optional[str] = None
+        
     def find_ffmpeg(self) -> Optional[str]:
         """
         Найти FFmpeg в системе или в загруженных файлах.
         
+        Результат кэшируется на FFMPEG_CACHE_TTL секунд.
+        
         Returns:
             Путь к FFmpeg или None
         """
+        now = time.monotonic()
+        if self._cached_at is not None and now - self._cached_at < FFMPEG_CACHE_TTL:
+            return self._cached_path
+        
+        self._cached_path = self._locate_ffmpeg()
+        self._cached_at = now
+        return self._cached_path
+    
+    def invalidate_cache(self):
+        """Сбросить кэш поиска FFmpeg (например, после загрузки)."""
+        self._cached_path = None
+        self._cached_at = None
+        self._verified_path = None
+        self.version = None
+    
+    def _locate_ffmpeg(self) -> Optional[str]:
+        """Поиск FFmpeg в PATH и в локальной директории без кэша."""
         # Сначала проверить системный PATH
         ffmpeg_path = shutil.which('ffmpeg')
         if ffmpeg_path:
@@ -73,11 +131,24 @@ class FFmpegManager:
         return None
     
     def is_ffmpeg_available(self) -> bool:
-        """Проверить, доступен ли FFmpeg."""
+        """
+        Проверить, доступен ли FFmpeg.
+        
+        `ffmpeg -version` запускается один раз для каждого найденного пути,
+        версия сохраняется в self.version.
+        """
         ffmpeg_path = self.find_ffmpeg()
         if not ffmpeg_path:
             return False
         
+        if ffmpeg_path != self._verified_path:
+            self.version = self._probe_version(ffmpeg_path)
+            self._verified_path = ffmpeg_path
+        
+        return self.version is not None
+    
+    def _probe_version(self, ffmpeg_path: str) -> Optional[str]:
+        """Запустить `ffmpeg -version` и вернуть строку версии или None."""
         try:
             result = subprocess.run(
                 [ffmpeg_path, '-version'],
@@ -85,10 +156,16 @@ class FFmpegManager:
                 stderr=subprocess.PIPE,
                 timeout=5
             )
-            return result.returncode == 0
+            if result.returncode != 0:
+                return None
+            # Первая строка: "ffmpeg version <версия> Copyright ..."
+            first_line = result.stdout.decode(errors='replace').split('\n', 1)[0].split()
+            version = first_line[2] if len(first_line) > 2 else 'unknown'
+            logger.info(f"FFmpeg {version} available at {ffmpeg_path}")
+            return version
         except Exception as e:
             logger.error(f"Error checking FFmpeg: {e}")
-            return False
+            return None
     
     def download_ffmpeg_windows(self, progress_callback=None) -> Optional[str]:
         """
@@ -109,55 +186,187 @@ class FFmpegManager:
             return None
         
         logger.info(f"Downloading FFmpeg from {url}")
+        progress_callback = _throttle_progress(progress_callback)
         
         try:
-            # Скачать архив
-            zip_path = self.ffmpeg_dir / 'ffmpeg.zip'
-            response = requests.get(url, stream=True, timeout=30)
-            total_size = int(response.headers.get('content-length', 0))
-            
-            with open(zip_path, 'wb') as f:
-                downloaded = 0
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        if progress_callback and total_size > 0:
-                            progress = (downloaded / total_size) * 100
-                            progress_callback(progress)
-            
-            logger.info("Extracting FFmpeg...")
-            # Распаковать
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(self.ffmpeg_dir)
-            
-            # Найти ffmpeg.exe в распакованных файлах
-            for root, dirs, files in os.walk(self.ffmpeg_dir):
-                if 'ffmpeg.exe' in files:
-                    ffmpeg_path = Path(root) / 'ffmpeg.exe'
-                    # Переместить в корень ffmpeg_dir
-                    target_path = self.ffmpeg_dir / 'ffmpeg.exe'
-                    if ffmpeg_path != target_path:
-                        shutil.move(str(ffmpeg_path), str(target_path))
-                    # Удалить архив и лишние файлы
-                    zip_path.unlink()
-                    # Очистить распакованные директории (оставить только exe)
-                    for item in self.ffmpeg_dir.iterdir():
-                        if item.is_dir():
-                            shutil.rmtree(item)
-                        elif item.name != 'ffmpeg.exe':
-                            item.unlink()
+            # Скачать архив во временный файл (в памяти до SPOOL_MAX_SIZE)
+            with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as archive:
+                try:
+                    downloaded = self._parallel_download(url, archive, progress_callback=progress_callback)
+                except Exception as e:
+                    # Например, CDN объявляет accept-ranges, но отдаёт 200 на Range
+                    logger.warning(f"Parallel download failed, falling back to single-stream download: {e}")
+                    downloaded = False
+                
+                if not downloaded:
+                    archive.seek(0)
+                    archive.truncate()
+                    self._stream_download(url, archive, progress_callback=progress_callback)
+                
+                if not self._verify_sha256(url, self._sha256_of(archive)):
+                    return None
+                
+                logger.info("Extracting FFmpeg...")
+                # Извлечь из архива только bin/ffmpeg.exe
+                archive.seek(0)
+                with zipfile.ZipFile(archive, 'r') as zip_ref:
+                    member = next(
+                        (info for info in zip_ref.infolist()
+                         if info.filename.endswith('/bin/ffmpeg.exe')),
+                        None
+                    )
+                    if member is None:
+                        logger.error("FFmpeg.exe not found in downloaded archive")
+                        return None
                     
-                    logger.info(f"FFmpeg downloaded to {target_path}")
-                    return str(target_path)
+                    target_path = self.ffmpeg_dir / 'ffmpeg.exe'
+                    with zip_ref.open(member) as src, open(target_path, 'wb') as dst:
+                        shutil.copyfileobj(src, dst, DOWNLOAD_CHUNK_SIZE)
             
-            logger.error("FFmpeg.exe not found in downloaded archive")
-            return None
+            self.invalidate_cache()
+            logger.info(f"FFmpeg downloaded to {target_path}")
+            return str(target_path)
             
         except Exception as e:
             logger.error(f"Error downloading FFmpeg: {e}")
             return None
     
+    def _stream_download(self, url: str, fileobj, progress_callback=None):
+        """Скачать файл одним потоком в открытый файловый объект."""
+        with requests.get(url, stream=True, timeout=30) as response:
+            response.raise_for_status()
+            total_size = int(response.headers.get('content-length', 0))
+            
+            downloaded = 0
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if chunk:
+                    fileobj.write(chunk)
+                    downloaded += len(chunk)
+                    if progress_callback and total_size > 0:
+                        progress = (downloaded / total_size) * 100
+                        progress_callback(progress)
+    
+    def _parallel_download(self, url: str, fileobj, parts: int = DOWNLOAD_PARTS,
+                           progress_callback=None) -> bool:
+        """
+        Скачать файл несколькими параллельными HTTP Range запросами.
+        
+        Каждая часть при обрыве соединения докачивается с места остановки.
+        Если часть скачать не удалось, остальные прерываются и исключение
+        пробрасывается - вызывающий код переходит на загрузку одним потоком.
+        
+        Args:
+            url: URL файла
+            fileobj: Открытый на запись файловый объект (поддерживающий seek)
+            parts: Количество параллельных соединений
+            progress_callback: Callback для отслеживания прогресса
+            
+        Returns:
+            False если сервер не поддерживает Range и нужна обычная загрузка
+        """
+        try:
+            head = requests.head(url, allow_redirects=True, timeout=30)
+            head.raise_for_status()
+        except requests.RequestException as e:
+            logger.warning(f"HEAD request failed, falling back to single-stream download: {e}")
+            return False
+        
+        total_size = int(head.headers.get('content-length', 0))
+        if head.headers.get('accept-ranges', '').lower() != 'bytes' or total_size < parts * DOWNLOAD_CHUNK_SIZE:
+            return False
+        
+        # Качаем с конечного адреса, чтобы не проходить редиректы в каждом потоке
+        url = head.url
+        part_size = -(-total_size // parts)
+        write_lock = threading.Lock()
+        failed = threading.Event()
+        downloaded = 0
+        
+        def fetch_part(start: int, end: int):
+            nonlocal downloaded
+            offset = start
+            for attempt in range(1, PART_RETRIES + 1):
+                try:
+                    headers = {'Range': f'bytes={offset}-{end}'}
+                    with requests.get(url, headers=headers, stream=True, timeout=30) as response:
+                        if response.status_code != 206:
+                            raise IOError(f"Range request not honored (HTTP {response.status_code})")
+                        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            if failed.is_set():
+                                return
+                            if not chunk:
+                                continue
+                            with write_lock:
+                                fileobj.seek(offset)
+                                fileobj.write(chunk)
+                                offset += len(chunk)
+                                downloaded += len(chunk)
+                                if progress_callback:
+                                    progress_callback((downloaded / total_size) * 100)
+                    if offset > end:
+                        return
+                except requests.RequestException as e:
+                    logger.warning(
+                        f"Download of bytes {offset}-{end} interrupted "
+                        f"(attempt {attempt}/{PART_RETRIES}): {e}"
+                    )
+            raise IOError(f"Failed to download bytes {start}-{end} after {PART_RETRIES} attempts")
+        
+        def run_part(start: int, end: int):
+            try:
+                fetch_part(start, end)
+            except BaseException:
+                # Остановить остальные части: архив всё равно качается заново
+                failed.set()
+                raise
+        
+        logger.info(f"Downloading {total_size} bytes in {parts} parallel parts")
+        with ThreadPoolExecutor(max_workers=parts) as pool:
+            futures = [
+                pool.submit(run_part, start, min(start + part_size, total_size) - 1)
+                for start in range(0, total_size, part_size)
+            ]
+            for future in futures:
+                future.result()
+        
+        return True
+    
+    @staticmethod
+    def _sha256_of(fileobj) -> str:
+        """Посчитать SHA-256 содержимого файлового объекта."""
+        sha256 = hashlib.sha256()
+        fileobj.seek(0)
+        for block in iter(lambda: fileobj.read(DOWNLOAD_CHUNK_SIZE), b''):
+            sha256.update(block)
+        return sha256.hexdigest()
+    
+    def _verify_sha256(self, url: str, digest: str) -> bool:
+        """
+        Сверить SHA-256 скачанного архива с опубликованной контрольной суммой.
+        
+        Args:
+            url: URL архива (контрольная сумма ищется по url + '.sha256')
+            digest: Посчитанный hex-дайджест архива
+            
+        Returns:
+            True только если контрольная сумма получена и совпала: без неё
+            архив не устанавливается
+        """
+        try:
+            response = requests.get(url + '.sha256', timeout=10)
+            response.raise_for_status()
+            expected = response.text.split()[0].strip().lower()
+        except Exception as e:
+            logger.error(f"Could not fetch FFmpeg checksum, refusing unverified archive: {e}")
+            return False
+        
+        if expected != digest:
+            logger.error(f"FFmpeg archive checksum mismatch: expected {expected}, got {digest}")
+            return False
+        
+        logger.info("FFmpeg archive checksum verified")
+        return True
+    
     def install_ffmpeg_linux(self) -> bool:
         """
         Попытаться установить FFmpeg через системный пакетный менеджер.
@@ -3,13 +3,23 @@
 """
 import logging
 import os
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+# Сколько секунд считать снимок содержимого директории моделей актуальным
+MODEL_SCAN_TTL = 1.0
+
+# Размер блока при записи скачиваемой модели
+DOWNLOAD_CHUNK_SIZE = 1 << 20
+
 # Доступные YOLO модели
 AVAILABLE_YOLO_MODELS = {
     # YOLOv8 модели
@@ -117,13 +127,69 @@ class ModelManager:
         
         # Также проверяем корневую директорию
         self.root_dir = Path(".")
+        
+        # Снимки директорий: путь -> ({filename: (path, size_bytes)}, время сканирования)
+        self._dir_cache: Dict[str, Tuple[Dict[str, Tuple[str, int]], float]] = {}
+        # Снимки читаются и сбрасываются из потоков API, бота и загрузок
+        self._dir_cache_lock = threading.Lock()
+        
+        # Общая HTTP-сессия: keep-alive между загрузками и повтор при сбоях
+        self._session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=8,
+            max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504))
+        )
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+    
+    def _scan_dir(self, directory: Path) -> Dict[str, Tuple[str, int]]:
+        """
+        Получить *.pt файлы директории одним проходом os.scandir.
+        
+        Результат кэшируется на MODEL_SCAN_TTL секунд.
+        
+        Returns:
+            Словарь {filename: (path, size_bytes)}
+        """
+        key = str(directory)
+        with self._dir_cache_lock:
+            now = time.monotonic()
+            cached = self._dir_cache.get(key)
+            if cached is not None and now - cached[1] < MODEL_SCAN_TTL:
+                return cached[0]
+            
+            entries = {}
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        if entry.name.endswith('.pt') and entry.is_file():
+                            entries[entry.name] = (str(directory / entry.name), entry.stat().st_size)
+            except FileNotFoundError:
+                pass
+            
+            self._dir_cache[key] = (entries, now)
+            return entries
+    
+    def _invalidate_dir_cache(self):
+        """Сбросить снимки директорий после изменения набора моделей."""
+        with self._dir_cache_lock:
+            self._dir_cache.clear()
+    
+    def _find_model(self, filename: str) -> Optional[Tuple[str, int]]:
+        """Найти модель в models/, затем в корне. Возвращает (path, size_bytes)."""
+        entry = self._scan_dir(self.models_dir).get(filename)
+        if entry is None:
+            entry = self._scan_dir(self.root_dir).get(filename)
+        return entry
     
     def list_available_models(self) -> List[Dict]:
         """Получить список доступных для загрузки моделей."""
         models = []
         
         for filename, info in AVAILABLE_YOLO_MODELS.items():
-            is_downloaded = self._is_model_downloaded(filename)
+            entry = self._find_model(filename)
+            is_downloaded = entry is not None
             
             model_info = {
                 'filename': filename,
@@ -137,9 +203,7 @@ class ModelManager:
             }
             
             if is_downloaded:
-                model_path = self._get_model_path(filename)
-                model_info['path'] = str(model_path)
-                model_info['size_bytes'] = model_path.stat().st_size if model_path.exists() else 0
+                model_info['path'], model_info['size_bytes'] = entry
             
             models.append(model_info)
         
@@ -150,20 +214,22 @@ class ModelManager:
         models = []
         
         # Проверить models/ директорию
-        for model_file in self.models_dir.glob("*.pt"):
-            models.append(self._get_model_info(model_file))
+        models_entries = self._scan_dir(self.models_dir)
+        for path, size_bytes in models_entries.values():
+            models.append(self._get_model_info(Path(path), size_bytes))
         
         # Проверить корневую директорию
-        for model_file in self.root_dir.glob("*.pt"):
-            if model_file.name not in [m['filename'] for m in models]:
-                models.append(self._get_model_info(model_file))
+        for filename, (path, size_bytes) in self._scan_dir(self.root_dir).items():
+            if filename not in models_entries:
+                models.append(self._get_model_info(Path(path), size_bytes))
         
         return models
     
-    def _get_model_info(self, model_path: Path) -> Dict:
+    def _get_model_info(self, model_path: Path, size_bytes: Optional[int] = None) -> Dict:
         """Получить информацию о модели."""
         filename = model_path.name
-        size_bytes = model_path.stat().st_size
+        if size_bytes is None:
+            size_bytes = model_path.stat().st_size
         size_mb = size_bytes / (1024 * 1024)
         
         # Дополнительная информация из AVAILABLE_YOLO_MODELS
@@ -182,29 +248,12 @@ class ModelManager:
     
     def _is_model_downloaded(self, filename: str) -> bool:
         """Проверить загружена ли модель."""
-        # Проверить в models/
-        if (self.models_dir / filename).exists():
-            return True
-        
-        # Проверить в корне
-        if (self.root_dir / filename).exists():
-            return True
-        
-        return False
+        return self._find_model(filename) is not None
     
     def _get_model_path(self, filename: str) -> Optional[Path]:
         """Получить путь к модели."""
-        # Сначала проверить models/
-        models_path = self.models_dir / filename
-        if models_path.exists():
-            return models_path
-        
-        # Затем корень
-        root_path = self.root_dir / filename
-        if root_path.exists():
-            return root_path
-        
-        return None
+        entry = self._find_model(filename)
+        return Path(entry[0]) if entry else None
     
     def download_model(self, filename: str, progress_callback=None) -> Dict:
         """
@@ -220,48 +269,62 @@ class ModelManager:
         if filename not in AVAILABLE_YOLO_MODELS:
             raise ValueError(f"Unknown model: {filename}")
         
-        if self._is_model_downloaded(filename):
+        entry = self._find_model(filename)
+        if entry is not None:
             logger.info(f"Model {filename} already downloaded")
-            return self._get_model_info(self._get_model_path(filename))
+            return self._get_model_info(Path(entry[0]), entry[1])
         
         model_info = AVAILABLE_YOLO_MODELS[filename]
         url = model_info['url']
         
-        # Сохранить в models/
+        # Сохранить в models/ через временный .part файл
         output_path = self.models_dir / filename
+        tmp_path = output_path.with_suffix(output_path.suffix + '.part')
         
         try:
             logger.info(f"Downloading {filename} from {url}")
             
-            response = requests.get(url, stream=True)
-            response.raise_for_status()
-            
-            total_size = int(response.headers.get('content-length', 0))
-            
-            with open(output_path, 'wb') as f:
-                if total_size == 0:
-                    f.write(response.content)
-                else:
-                    downloaded = 0
-                    chunk_size = 8192
+            with self._session.get(url, stream=True) as response:
+                response.raise_for_status()
+                
+                total_size = int(response.headers.get('content-length', 0))
+                
+                flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0)
+                with os.fdopen(os.open(tmp_path, flags, 0o644), 'wb') as f:
+                    # Подсказать ядру последовательную запись (только POSIX)
+                    if hasattr(os, 'posix_fadvise'):
+                        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+                    
+                    if total_size == 0:
+                        f.write(response.content)
+                    else:
+                        downloaded = 0
+                        
+                        for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                            if chunk:
+                                f.write(chunk)
+                                downloaded += len(chunk)
+                                
+                                if progress_callback:
+                                    progress = int((downloaded / total_size) * 100)
+                                    progress_callback(progress, downloaded, total_size)
                     
-                    for chunk in response.iter_content(chunk_size=chunk_size):
-                        if chunk:
-                            f.write(chunk)
-                            downloaded += len(chunk)
-                            
-                            if progress_callback:
-                                progress = int((downloaded / total_size) * 100)
-                                progress_callback(progress, downloaded, total_size)
+                    f.flush()
+                    os.fsync(f.fileno())
+                
+            # Модель появляется под своим именем только целиком
+            os.replace(tmp_path, output_path)
             
+            self._invalidate_dir_cache()
             logger.info(f"Successfully downloaded {filename}")
             return self._get_model_info(output_path)
         
         except Exception as e:
             logger.error(f"Error downloading model {filename}: {e}")
             # Удалить частично загруженный файл
-            if output_path.exists():
-                output_path.unlink()
+            if tmp_path.exists():
+                tmp_path.unlink()
+            self._invalidate_dir_cache()
             raise
     
     def delete_model(self, filename: str) -> bool:
@@ -273,6 +336,7 @@ class ModelManager:
         
         try:
             model_path.unlink()
+            self._invalidate_dir_cache()
             logger.info(f"Deleted model {filename}")
             return True
         except Exception as e:
@@ -5,19 +5,48 @@ import time
 import logging
 from typing import Dict, List, Optional
 from datetime import datetime, timezone
+import numpy as np
 
 logger = logging.getLogger(__name__)
 
 
+def _iso_utc(ts: float) -> str:
+    """Format a Unix timestamp as a UTC ISO 8601 string."""
+    # Positional tz skips keyword parsing in the C constructor
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
 class OccupancyTracker:
     """Tracks parking spot occupancy with timer-based detection."""
     
     def __init__(self, occupancy_minutes: int = 5):
         self.occupancy_minutes = occupancy_minutes
-        self.spot_timers: Dict[str, float] = {}  # spot_id -> first_detection_time
-        self.spot_states: Dict[str, bool] = {}  # spot_id -> is_occupied
-        self.sequential_numbers: Dict[str, int] = {}  # spot_id -> sequential number
+        
+        # Состояние мест хранится в параллельных массивах, индекс места - в _id2idx
+        self._id2idx: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self.timers = np.full(0, np.nan)  # first_detection_time (time.monotonic), NaN - таймер не запущен
+        self.states = np.zeros(0, dtype=bool)  # is_occupied
+        self.seq_nums = np.zeros(0, dtype=np.int64)  # sequential number, 0 - нет
         self.next_sequential = 1
+    
+    def _index_of(self, spot_id: str) -> int:
+        """Get array index for a spot, registering it if needed."""
+        idx = self._id2idx.get(spot_id)
+        if idx is None:
+            idx = len(self._ids)
+            self._id2idx[spot_id] = idx
+            self._ids.append(spot_id)
+            if idx >= len(self.timers):
+                self._grow(max(16, 2 * len(self.timers)))
+        return idx
+    
+    def _grow(self, capacity: int):
+        """Extend state arrays to the given capacity."""
+        extra = capacity - len(self.timers)
+        self.timers = np.concatenate([self.timers, np.full(extra, np.nan)])
+        self.states = np.concatenate([self.states, np.zeros(extra, dtype=bool)])
+        self.seq_nums = np.concatenate([self.seq_nums, np.zeros(extra, dtype=np.int64)])
         
     def update_detections(self, detections: Dict[str, bool]) -> Dict[str, Dict]:
         """
@@ -29,88 +58,125 @@ class OccupancyTracker:
         Returns:
             Dictionary of changed spots with their new states
         """
-        current_time = time.time()
+        # Таймеры считаются по монотонным часам, настенное время нужно только для ISO
+        current_time = time.monotonic()
         threshold_seconds = self.occupancy_minutes * 60
         changes = {}
         
-        for spot_id, vehicle_detected in detections.items():
-            was_occupied = self.spot_states.get(spot_id, False)
+        if not detections:
+            return changes
+        
+        idxs = np.fromiter((self._index_of(spot_id) for spot_id in detections),
+                           dtype=np.intp, count=len(detections))
+        vals = np.fromiter(detections.values(), dtype=bool, count=len(detections))
+        
+        n = len(self._ids)
+        timers = self.timers[:n]
+        states = self.states[:n]
+        
+        seen = np.zeros(n, dtype=bool)
+        seen[idxs] = True
+        detected = np.zeros(n, dtype=bool)
+        detected[idxs] = vals
+        
+        # Vehicle detected: start timer on first detection, otherwise check threshold
+        timer_idle = np.isnan(timers)
+        started = detected & timer_idle
+        with np.errstate(invalid='ignore'):
+            newly_occupied = detected & ~timer_idle & ~states & (current_time - timers >= threshold_seconds)
+        
+        # No vehicle detected: drop timer and free the spot if it was occupied
+        cleared = seen & ~detected
+        newly_freed = cleared & states
+        
+        # Preserve the order of the incoming detections for numbering and output
+        occupied_idxs = idxs[newly_occupied[idxs]]
+        freed_idxs = idxs[newly_freed[idxs]]
+        
+        timers[started] = current_time
+        timers[cleared] = np.nan
+        states[occupied_idxs] = True
+        states[freed_idxs] = False
+        self.seq_nums[occupied_idxs] = np.arange(
+            self.next_sequential, self.next_sequential + len(occupied_idxs)
+        )
+        self.seq_nums[freed_idxs] = 0
+        self.next_sequential += len(occupied_idxs)
+        
+        if logger.isEnabledFor(logging.DEBUG):
+            for idx in np.flatnonzero(started):
+                logger.debug(f"Spot {self._ids[idx]}: vehicle detected, timer started")
+        
+        if len(occupied_idxs):
+            # Spots started in the same frame share a timer value, format each once
+            wall_time = time.time()
+            now_iso = _iso_utc(wall_time)
+            detected_iso: Dict[float, str] = {}
+        
+        for idx in occupied_idxs.tolist():
+            spot_id = self._ids[idx]
+            sequential_number = int(self.seq_nums[idx])
+            timer = float(timers[idx])
+            detected_at = detected_iso.get(timer)
+            if detected_at is None:
+                detected_wall = wall_time - (current_time - timer)
+                detected_at = _iso_utc(detected_wall)
+                detected_iso[timer] = detected_at
             
-            if vehicle_detected:
-                # Vehicle detected in spot
-                if spot_id not in self.spot_timers:
-                    # First detection
-                    self.spot_timers[spot_id] = current_time
-                    logger.debug(f"Spot {spot_id}: vehicle detected, timer started")
-                else:
-                    # Check if timer threshold exceeded
-                    elapsed = current_time - self.spot_timers[spot_id]
-                    if elapsed >= threshold_seconds and not was_occupied:
-                        # Mark as occupied
-                        self.spot_states[spot_id] = True
-                        self.sequential_numbers[spot_id] = self.next_sequential
-                        self.next_sequential += 1
-                        
-                        changes[spot_id] = {
-                            'occupied': True,
-                            'detected_at': datetime.fromtimestamp(
-                                self.spot_timers[spot_id], tz=timezone.utc
-                            ).isoformat(),
-                            'occupied_since': datetime.fromtimestamp(
-                                current_time, tz=timezone.utc
-                            ).isoformat(),
-                            'sequential_number': self.sequential_numbers[spot_id]
-                        }
-                        logger.info(f"Spot {spot_id}: marked as OCCUPIED (#{self.sequential_numbers[spot_id]})")
-            else:
-                # No vehicle detected
-                if spot_id in self.spot_timers:
-                    del self.spot_timers[spot_id]
-                
-                if was_occupied:
-                    # Mark as free
-                    self.spot_states[spot_id] = False
-                    if spot_id in self.sequential_numbers:
-                        del self.sequential_numbers[spot_id]
-                    
-                    changes[spot_id] = {
-                        'occupied': False,
-                        'detected_at': None,
-                        'occupied_since': None,
-                        'sequential_number': None
-                    }
-                    logger.info(f"Spot {spot_id}: marked as FREE")
+            changes[spot_id] = {
+                'occupied': True,
+                'detected_at': detected_at,
+                'occupied_since': now_iso,
+                'sequential_number': sequential_number
+            }
+            logger.info(f"Spot {spot_id}: marked as OCCUPIED (#{sequential_number})")
+        
+        for idx in freed_idxs.tolist():
+            spot_id = self._ids[idx]
+            changes[spot_id] = {
+                'occupied': False,
+                'detected_at': None,
+                'occupied_since': None,
+                'sequential_number': None
+            }
+            logger.info(f"Spot {spot_id}: marked as FREE")
         
         return changes
     
     def get_spot_state(self, spot_id: str) -> Dict:
         """Get current state of a spot."""
-        is_occupied = self.spot_states.get(spot_id, False)
+        idx = self._id2idx.get(spot_id)
+        if idx is None:
+            return {
+                'occupied': False,
+                'sequential_number': None,
+                'timer_active': False,
+                'timer_elapsed': 0
+            }
+        
+        timer = float(self.timers[idx])
+        timer_active = not np.isnan(timer)
         return {
-            'occupied': is_occupied,
-            'sequential_number': self.sequential_numbers.get(spot_id),
-            'timer_active': spot_id in self.spot_timers,
-            'timer_elapsed': (
-                time.time() - self.spot_timers[spot_id]
-                if spot_id in self.spot_timers else 0
-            )
+            'occupied': bool(self.states[idx]),
+            'sequential_number': int(self.seq_nums[idx]) or None,
+            'timer_active': timer_active,
+            'timer_elapsed': time.monotonic() - timer if timer_active else 0
         }
     
     def get_all_states(self) -> Dict[str, Dict]:
         """Get states of all tracked spots."""
         return {
             spot_id: self.get_spot_state(spot_id)
-            for spot_id in self.spot_states.keys()
+            for spot_id in self._ids
         }
     
     def reset_spot(self, spot_id: str):
         """Reset a spot's state."""
-        if spot_id in self.spot_timers:
-            del self.spot_timers[spot_id]
-        if spot_id in self.spot_states:
-            del self.spot_states[spot_id]
-        if spot_id in self.sequential_numbers:
-            del self.sequential_numbers[spot_id]
+        idx = self._id2idx.get(spot_id)
+        if idx is not None:
+            self.timers[idx] = np.nan
+            self.states[idx] = False
+            self.seq_nums[idx] = 0
         logger.info(f"Reset spot {spot_id}")
     
     def set_occupancy_threshold(self, minutes: int):
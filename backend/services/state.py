@@ -8,6 +8,23 @@ from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# Shared read-only default for missing spot states (never mutate)
+_EMPTY_DICT: Dict = {}
+
+
+def _ensure_space(state_data: Dict, space_id: str) -> Dict:
+    """Return the state entry for a space, creating an empty one if missing."""
+    spaces = state_data['spaces']
+    space_state = spaces.get(space_id)
+    if space_state is None:
+        space_state = spaces[space_id] = {
+            'total_spots': 0,
+            'occupied_spots': 0,
+            'free_spots': 0,
+            'spots': {}
+        }
+    return space_state
+
 
 class StateManager:
     """Manages parking state and provides aggregated views."""
@@ -17,6 +34,30 @@ class StateManager:
         self.lock = threading.Lock()
         self.event_callbacks = []
         
+        # Index of spots by id and by space, rebuilt when spots.json changes
+        # (in-process writes and edits on disk, see JSONStore.get_version)
+        self._spot_index: Dict[str, Dict] = {}
+        self._spots_by_space: Dict[str, List[Dict]] = {}
+        self._index_version = None
+        
+        # space_id -> index version at which its aggregates were last fully recounted
+        self._stats_version: Dict[str, tuple] = {}
+    
+    def _ensure_index(self):
+        """Rebuild spot indexes if spots.json changed since the last build."""
+        version = self.store.get_version("spots.json")
+        if version == self._index_version:
+            return
+        
+        spots = self.store.get_spots()
+        spots_by_space: Dict[str, List[Dict]] = {}
+        for spot in spots:
+            spots_by_space.setdefault(spot['space_id'], []).append(spot)
+        
+        self._spot_index = {spot['id']: spot for spot in spots}
+        self._spots_by_space = spots_by_space
+        self._index_version = version
+    
     def update_spot_state(self, spot_id: str, state_update: Dict):
         """
         Update a single spot's state.
@@ -27,8 +68,8 @@ class StateManager:
         """
         def updater(data):
             # Find the space for this spot
-            spots = self.store.get_spots()
-            spot = next((s for s in spots if s['id'] == spot_id), None)
+            self._ensure_index()
+            spot = self._spot_index.get(spot_id)
             
             if not spot:
                 logger.warning(f"Spot {spot_id} not found")
@@ -37,19 +78,10 @@ class StateManager:
             space_id = spot['space_id']
             
             # Ensure space exists in state
-            if space_id not in data['spaces']:
-                data['spaces'][space_id] = {
-                    'total_spots': 0,
-                    'occupied_spots': 0,
-                    'free_spots': 0,
-                    'spots': {}
-                }
+            _ensure_space(data, space_id)
             
-            # Update spot state
-            data['spaces'][space_id]['spots'][spot_id] = state_update
-            
-            # Recalculate aggregates for this space
-            self._recalculate_space_stats(data, space_id)
+            # Update spot state and aggregates for this space
+            self._set_spot_state(data, spot, state_update)
             
             return data
         
@@ -63,30 +95,15 @@ class StateManager:
     def update_multiple_spots(self, updates: Dict[str, Dict]):
         """Update multiple spots at once."""
         def updater(data):
-            spots = self.store.get_spots()
-            affected_spaces = set()
+            self._ensure_index()
             
             for spot_id, state_update in updates.items():
-                spot = next((s for s in spots if s['id'] == spot_id), None)
+                spot = self._spot_index.get(spot_id)
                 if not spot:
                     continue
                 
-                space_id = spot['space_id']
-                affected_spaces.add(space_id)
-                
-                if space_id not in data['spaces']:
-                    data['spaces'][space_id] = {
-                        'total_spots': 0,
-                        'occupied_spots': 0,
-                        'free_spots': 0,
-                        'spots': {}
-                    }
-                
-                data['spaces'][space_id]['spots'][spot_id] = state_update
-            
-            # Recalculate stats for affected spaces
-            for space_id in affected_spaces:
-                self._recalculate_space_stats(data, space_id)
+                _ensure_space(data, spot['space_id'])
+                self._set_spot_state(data, spot, state_update)
             
             return data
         
@@ -94,15 +111,40 @@ class StateManager:
             self.store.update_state(updater)
             self._notify_state_change('bulk_update', {'count': len(updates)})
     
+    def _set_spot_state(self, state_data: Dict, spot: Dict, state_update: Dict):
+        """
+        Store a spot's new state and adjust its space aggregates.
+        
+        Aggregates are updated by the occupancy delta of this spot. A full
+        recount is done only if spots were added/removed since the space
+        was last recounted.
+        """
+        space_id = spot['space_id']
+        space_state = state_data['spaces'][space_id]
+        was_occupied = space_state['spots'].get(spot['id'], {}).get('occupied', False)
+        space_state['spots'][spot['id']] = state_update
+        
+        if self._stats_version.get(space_id) != self._index_version:
+            self._recalculate_space_stats(state_data, space_id)
+        elif spot['type'] == 'parking':
+            delta = int(bool(state_update.get('occupied', False))) - int(bool(was_occupied))
+            space_state['occupied_spots'] += delta
+            space_state['free_spots'] -= delta
+    
     def _recalculate_space_stats(self, state_data: Dict, space_id: str):
         """Recalculate aggregate statistics for a space."""
-        spots = self.store.get_spots()
-        space_spots = [s for s in spots if s['space_id'] == space_id and s['type'] == 'parking']
+        self._ensure_index()
+        self._stats_version[space_id] = self._index_version
+        space_spots = [
+            s for s in self._spots_by_space.get(space_id, ())
+            if s['type'] == 'parking'
+        ]
         
+        spots_state = state_data['spaces'][space_id]['spots']
         total = len(space_spots)
         occupied = sum(
             1 for spot in space_spots
-            if state_data['spaces'][space_id]['spots'].get(spot['id'], {}).get('occupied', False)
+            if (spots_state.get(spot['id']) or _EMPTY_DICT).get('occupied', False)
         )
         free = total - occupied
         
@@ -117,7 +159,8 @@ class StateManager:
     
     def get_all_spaces_summary(self) -> List[Dict]:
         """Get summary of all parking spaces."""
-        state = self.store.get_state()
+        # Только чтение: снимок состояния берётся без копирования
+        state = self.store.get_state_view()
         spaces = self.store.get_spaces()
         
         summary = []
@@ -141,15 +184,16 @@ class StateManager:
     
     def get_spot_details(self, space_id: str) -> List[Dict]:
         """Get detailed information about spots in a space."""
-        state = self.store.get_state()
+        state = self.store.get_state_view()
         spots = self.store.get_spots()
         
         space_spots = [s for s in spots if s['space_id'] == space_id]
-        space_state = state['spaces'].get(space_id, {})
+        space_state = state['spaces'].get(space_id) or _EMPTY_DICT
+        spots_state = space_state.get('spots') or _EMPTY_DICT
         
         details = []
         for spot in space_spots:
-            spot_state = space_state.get('spots', {}).get(spot['id'], {})
+            spot_state = spots_state.get(spot['id']) or _EMPTY_DICT
             details.append({
                 'id': spot['id'],
                 'label': spot['label'],
@@ -167,23 +211,29 @@ class StateManager:
         """Initialize state for a new space."""
         def updater(data):
             if space_id not in data['spaces']:
-                data['spaces'][space_id] = {
-                    'total_spots': 0,
-                    'occupied_spots': 0,
-                    'free_spots': 0,
-                    'spots': {}
-                }
+                _ensure_space(data, space_id)
                 self._recalculate_space_stats(data, space_id)
             return data
         
         with self.lock:
             self.store.update_state(updater)
     
+    def spot_topology_changed(self, space_id: str):
+        """Recount space aggregates after spots were added, removed or edited."""
+        def updater(data):
+            _ensure_space(data, space_id)
+            self._recalculate_space_stats(data, space_id)
+            return data
+        
+        with self.lock:
+            self.store.update_state(updater)
+    
     def remove_space(self, space_id: str):
         """Remove space from state."""
         def updater(data):
             if space_id in data['spaces']:
                 del data['spaces'][space_id]
+            self._stats_version.pop(space_id, None)
             return data
         
         with self.lock:
@@ -203,8 +253,7 @@ class StateManager:
     
     def get_active_stream(self) -> Optional[Dict]:
         """Get information about active stream."""
-        state = self.store.get_state()
-        return state.get('active_stream')
+        return self.store.get_active_stream()
     
     def set_active_stream(self, stream_info: Optional[Dict]):
         """Set active stream information."""
@@ -1,118 +1,181 @@
 """
 Video processor for capturing RTSP streams and maintaining frame buffer.
 """
-import cv2
+import multiprocessing
+import sys
 import threading
 import time
 import logging
-from typing import Optional, Dict
+from contextlib import nullcontext
+from multiprocessing import shared_memory
+from typing import Optional, Dict, List
 import numpy as np
 
+from backend.capture import (
+    VideoProcessor, capture_process_main, MAX_SHARED_FRAME_BYTES,
+    HDR_SEQ, HDR_HEIGHT, HDR_WIDTH, HDR_CHANNELS, HDR_FRAME_TIME, HDR_FPS, HDR_SIZE
+)
+
 logger = logging.getLogger(__name__)
 
+# В CPython чтение dict по ключу атомарно под GIL, поэтому читатели
+# VideoProcessorManager обходятся без блокировки. На других реализациях
+# (PyPy и т.п.) чтения по-прежнему идут под lock.
+_ATOMIC_DICT_READS = sys.implementation.name == 'cpython'
 
-class VideoProcessor:
-    """Manages video capture from RTSP streams."""
-    
-    def __init__(self, camera_id: str, rtsp_url: str):
-        self.camera_id = camera_id
-        self.rtsp_url = rtsp_url
-        self.cap: Optional[cv2.VideoCapture] = None
-        self.latest_frame: Optional[np.ndarray] = None
-        self.frame_lock = threading.Lock()
-        self.running = False
-        self.thread: Optional[threading.Thread] = None
-        self.last_frame_time = 0
-        self.fps = 0
-        self.reconnect_delay = 5  # seconds
-        
+
+class ProcessVideoProcessor(VideoProcessor):
+    """
+    Video processor whose capture loop runs in a separate process.
+    
+    Decoding and frame handling happen outside this interpreter's GIL.
+    Frames come through a shared memory buffer and are copied out once
+    per new frame, so readers get the same read-only-per-frame arrays as
+    with the threaded VideoProcessor.
+    """
+    
+    def __init__(self, camera_id: str, rtsp_url: str, hw_decode: bool = True,
+                 max_frame_bytes: int = MAX_SHARED_FRAME_BYTES):
+        super().__init__(camera_id, rtsp_url, hw_decode)
+        # spawn, а не fork: к моменту добавления камеры в процессе уже работают
+        # потоки (детекция, Flask, бот, запись JSONStore), загружен torch/CUDA -
+        # форк такого процесса может зависнуть на унаследованных блокировках
+        self._ctx = multiprocessing.get_context('spawn')
+        self._shm = shared_memory.SharedMemory(create=True, size=max_frame_bytes)
+        # Читатели копируют кадр из _shm под этим lock, stop() под ним же
+        # освобождает буфер: процессор может оставаться у читателя после
+        # remove_camera (чтения менеджера идут без блокировки)
+        self._shm_lock = threading.Lock()
+        self._shm_closed = False
+        self._header = self._ctx.Array('d', HDR_SIZE, lock=False)
+        self._stop_event = None
+        self._process: Optional[multiprocessing.Process] = None
+        self._process_lock = threading.Lock()
+        self._last_child_check = 0.0
+        self._seen_seq = 0.0
+    
     def start(self):
-        """Start video capture thread."""
-        if self.running:
-            logger.warning(f"Video processor for {self.camera_id} already running")
-            return
+        """Start video capture process."""
+        with self._process_lock:
+            if self.running:
+                logger.warning(f"Video processor for {self.camera_id} already running")
+                return
+            
+            self.running = True
+            self._spawn()
+    
+    def _spawn(self):
+        """Start a capture child process (called with _process_lock held)."""
+        header = self._header
+        if int(header[HDR_SEQ]) % 2:
+            # Прежний процесс умер посреди записи кадра: закрыть seqlock,
+            # пометив кадр пустым, чтобы читатели его не взяли
+            header[HDR_HEIGHT] = 0
+            header[HDR_SEQ] += 1
         
-        self.running = True
-        self.thread = threading.Thread(target=self._capture_loop, daemon=True)
-        self.thread.start()
-        logger.info(f"Started video processor for camera {self.camera_id}")
+        # Новый Event на каждый процесс: если прежний процесс убит во время
+        # stop_event.wait(), счётчик ожидающих в Event остаётся испорченным,
+        # и set() на нём зависает
+        self._stop_event = self._ctx.Event()
+        self._process = self._ctx.Process(
+            target=capture_process_main,
+            args=(self.camera_id, self.rtsp_url, self.hw_decode,
+                  self._shm.name, header, self._stop_event),
+            daemon=True
+        )
+        self._process.start()
+        logger.info(f"Started capture process for camera {self.camera_id} (pid {self._process.pid})")
+    
+    def _check_child(self):
+        """Restart the capture process if it died (checked at most once per reconnect_delay)."""
+        now = time.monotonic()
+        if not self.running or now - self._last_child_check < self.reconnect_delay:
+            return
+        if not self._process_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_child_check = now
+            process = self._process
+            if self.running and process is not None and not process.is_alive():
+                logger.error(
+                    f"Capture process for {self.camera_id} exited with code "
+                    f"{process.exitcode}, restarting"
+                )
+                self._spawn()
+        finally:
+            self._process_lock.release()
     
     def stop(self):
-        """Stop video capture thread."""
-        self.running = False
-        if self.thread:
-            self.thread.join(timeout=5)
-        if self.cap:
-            self.cap.release()
+        """Stop video capture process and release shared memory."""
+        with self._process_lock:
+            self.running = False
+            if self._stop_event is not None:
+                self._stop_event.set()
+            if self._process:
+                self._process.join(timeout=5)
+                if self._process.is_alive():
+                    self._process.terminate()
+                self._process = None
+        with self._shm_lock:
+            if not self._shm_closed:
+                self._shm_closed = True
+                self._shm.close()
+                self._shm.unlink()
         logger.info(f"Stopped video processor for camera {self.camera_id}")
     
-    def _capture_loop(self):
-        """Main capture loop with auto-reconnect."""
-        while self.running:
-            try:
-                self._connect()
-                while self.running and self.cap and self.cap.isOpened():
-                    ret, frame = self.cap.read()
-                    
-                    if not ret:
-                        logger.warning(f"Failed to read frame from {self.camera_id}")
-                        break
-                    
-                    with self.frame_lock:
-                        self.latest_frame = frame.copy()
-                        current_time = time.time()
-                        if self.last_frame_time > 0:
-                            self.fps = 1.0 / (current_time - self.last_frame_time)
-                        self.last_frame_time = current_time
-                    
-                    # Small delay to prevent CPU overload
-                    time.sleep(0.01)
-                
-            except Exception as e:
-                logger.error(f"Error in capture loop for {self.camera_id}: {e}")
-            
-            finally:
-                if self.cap:
-                    self.cap.release()
-                    self.cap = None
-            
-            if self.running:
-                logger.info(f"Reconnecting to {self.camera_id} in {self.reconnect_delay}s...")
-                time.sleep(self.reconnect_delay)
-    
-    def _connect(self):
-        """Connect to RTSP stream."""
-        logger.info(f"Connecting to RTSP stream: {self.camera_id}")
-        self.cap = cv2.VideoCapture(self.rtsp_url)
-        
-        # Set buffer size to minimize latency
-        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-        
-        if not self.cap.isOpened():
-            raise ConnectionError(f"Failed to open RTSP stream for {self.camera_id}")
+    def _sync(self):
+        """Copy a new frame out of shared memory if the child published one."""
+        header = self._header
+        seq = header[HDR_SEQ]
+        if seq == self._seen_seq or int(seq) % 2:
+            self._check_child()
+            return
         
-        logger.info(f"Connected to {self.camera_id}")
+        with self._shm_lock:
+            # Кадр мог уже скопировать другой читатель, пока мы ждали lock
+            if self._shm_closed or seq == self._seen_seq:
+                return
+            shape = (int(header[HDR_HEIGHT]), int(header[HDR_WIDTH]), int(header[HDR_CHANNELS]))
+            if shape[0] == 0:
+                # Недописанный кадр упавшего процесса
+                self._seen_seq = seq
+                return
+            frame_time = header[HDR_FRAME_TIME]
+            fps = header[HDR_FPS]
+            frame = np.ndarray(shape, dtype=np.uint8, buffer=self._shm.buf).copy()
+            if header[HDR_SEQ] != seq:
+                # Кадр перезаписали во время копирования - возьмём следующий
+                return
+            
+            with self.frame_lock:
+                self._seen_seq = seq
+                self.latest_frame = frame
+                self.last_frame_time = frame_time
+                self.fps = fps
     
     def get_latest_frame(self) -> Optional[np.ndarray]:
-        """Get the latest captured frame (thread-safe)."""
-        with self.frame_lock:
-            return self.latest_frame.copy() if self.latest_frame is not None else None
+        self._sync()
+        return super().get_latest_frame()
+    
+    def get_latest_frame_view(self) -> Optional[np.ndarray]:
+        self._sync()
+        return super().get_latest_frame_view()
     
     def is_alive(self) -> bool:
-        """Check if capture is active and receiving frames."""
-        with self.frame_lock:
-            if self.latest_frame is None:
-                return False
-            # Consider alive if we got a frame in the last 10 seconds
-            return (time.time() - self.last_frame_time) < 10
+        self._sync()
+        return super().is_alive()
 
 
 class VideoProcessorManager:
     """Manages multiple video processors."""
     
-    def __init__(self):
+    def __init__(self, use_processes: bool = False):
         self.processors: Dict[str, VideoProcessor] = {}
+        # Запускать захват каждой камеры в отдельном процессе (ProcessVideoProcessor)
+        self.use_processes = use_processes
+        # lock сериализует добавление/удаление камер; чтения его не берут (см. _ATOMIC_DICT_READS)
         self.lock = threading.Lock()
+        self._read_lock = nullcontext() if _ATOMIC_DICT_READS else self.lock
     
     def add_camera(self, camera_id: str, rtsp_url: str):
         """Add and start a camera processor."""
@@ -121,7 +184,8 @@ class VideoProcessorManager:
                 logger.warning(f"Camera {camera_id} already exists")
                 return
             
-            processor = VideoProcessor(camera_id, rtsp_url)
+            processor_cls = ProcessVideoProcessor if self.use_processes else VideoProcessor
+            processor = processor_cls(camera_id, rtsp_url)
             processor.start()
             self.processors[camera_id] = processor
             logger.info(f"Added camera processor: {camera_id}")
@@ -139,20 +203,46 @@ class VideoProcessorManager:
     
     def get_frame(self, camera_id: str) -> Optional[np.ndarray]:
         """Get latest frame from a camera."""
-        with self.lock:
+        with self._read_lock:
             processor = self.processors.get(camera_id)
             if processor:
                 return processor.get_latest_frame()
             return None
     
+    def get_frame_view(self, camera_id: str) -> Optional[np.ndarray]:
+        """Get latest frame from a camera without copying (read-only)."""
+        with self._read_lock:
+            processor = self.processors.get(camera_id)
+            if processor:
+                return processor.get_latest_frame_view()
+            return None
+    
+    def get_latest_frames(self, camera_ids: List[str]) -> Dict[str, np.ndarray]:
+        """
+        Get latest frames from several cameras in one pass (for batched detection).
+        
+        Frames are returned by reference without copying: capture threads
+        never modify a published frame, but callers must not write to them.
+        """
+        with self._read_lock:
+            frames = {}
+            for camera_id in camera_ids:
+                processor = self.processors.get(camera_id)
+                if processor is None:
+                    continue
+                frame = processor.get_latest_frame_view()
+                if frame is not None:
+                    frames[camera_id] = frame
+            return frames
+    
     def get_all_camera_ids(self) -> list:
         """Get list of all active camera IDs."""
-        with self.lock:
+        with self._read_lock:
             return list(self.processors.keys())
     
     def is_camera_alive(self, camera_id: str) -> bool:
         """Check if camera is actively receiving frames."""
-        with self.lock:
+        with self._read_lock:
             processor = self.processors.get(camera_id)
             return processor.is_alive() if processor else False
     
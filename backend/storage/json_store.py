@@ -1,129 +1,727 @@
 """
 JSON storage module with atomic read/write and file locking.
 """
+import atexit
+import itertools
 import json
+import locale
 import os
 import logging
+import pickle
+import stat
+import sys
+import tempfile
+import threading
+import time
+from contextlib import nullcontext
 from pathlib import Path
-from typing import Any, Dict
-import portalocker
-from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+if sys.platform == 'win32':
+    import msvcrt
+    
+    def _try_lock(fd: int):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+    
+    def _unlock(fd: int):
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+    
+    def _try_lock(fd: int):
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    
+    def _unlock(fd: int):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+# Суффиксы временных файлов записи и файлов блокировки рядом с данными
+TMP_SUFFIX = ".tmp"
+LOCK_SUFFIX = ".lock"
+
+# Файлы с частыми обновлениями: держатся в памяти, на диск пишется последний снимок
+COALESCED_FILES = ("state.json",)
+# Максимальная задержка записи таких файлов на диск (секунды)
+FLUSH_INTERVAL = 0.1
+# Журнал изменений таких файлов и число патчей до полной перезаписи файла
+PATCH_LOG_SUFFIX = ".patches"
+PATCH_COMPACT_EVERY = 100
+
+# В CPython get/set/pop у dict атомарны под GIL, поэтому кэш чтений работает
+# без блокировки: параллельные читатели не сериализуются друг с другом.
+# На других реализациях доступ к кэшу идёт под lock.
+_ATOMIC_DICT_OPS = sys.implementation.name == 'cpython'
+
+# Таймаут захвата блокировки файла и интервал повторных попыток (секунды)
+LOCK_TIMEOUT = 2.0
+LOCK_POLL_INTERVAL = 0.005
+
+# Порог предупреждения о медленной записи (миллисекунды)
+SLOW_OPERATION_MS = 500
+
+# Права новых файлов данных: mkstemp создаёт файлы с правами 0600.
+# umask не читаем - os.umask меняет его для всего процесса, а не только
+# для текущего потока
+DEFAULT_FILE_MODE = 0o644
+
+# Сколько раз повторять os.replace на Windows, пока читатель держит файл открытым
+REPLACE_RETRIES = 50
+
+
+def _replace(src: str, dst: str):
+    """os.replace that retries on Windows while the target is briefly open elsewhere."""
+    for attempt in range(REPLACE_RETRIES):
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            if sys.platform != 'win32' or attempt == REPLACE_RETRIES - 1:
+                raise
+            time.sleep(0.01)
+
+
+def _file_signature(filepath: str) -> Optional[Tuple[int, int, int]]:
+    """(mtime_ns, size, inode) of a file, or None if it does not exist."""
+    try:
+        st = os.stat(filepath)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+def _has_contents(filepath: str, payload: bytes) -> bool:
+    """Check whether the file already holds exactly payload."""
+    try:
+        if os.stat(filepath).st_size != len(payload):
+            return False
+        with open(filepath, 'rb') as f:
+            return f.read() == payload
+    except OSError:
+        return False
+
+
+def _diff_ops(old: Dict[str, Any], new: Dict[str, Any], path: list, ops: list):
+    """Append ["set", path, value] / ["del", path] operations turning old into new."""
+    for key in old:
+        if key not in new:
+            ops.append(["del", path + [key]])
+    for key, value in new.items():
+        if key in old:
+            prev = old[key]
+            if isinstance(prev, dict) and isinstance(value, dict):
+                _diff_ops(prev, value, path + [key], ops)
+                continue
+            if prev == value:
+                continue
+        ops.append(["set", path + [key], value])
+
+
+def _apply_ops(data: Dict[str, Any], ops: list):
+    """Apply operations produced by _diff_ops to data in place."""
+    for op in ops:
+        path = op[1]
+        target = data
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        if op[0] == "set":
+            target[path[-1]] = op[2]
+        else:
+            target.pop(path[-1], None)
+
+
+# Компактный энкодер stdlib: без indent json использует C-реализацию
+_compact_encode = json.JSONEncoder(ensure_ascii=False).encode
+
+
+def _dumps_list_document(key: str, items: list) -> bytes:
+    """
+    Serialize {key: [item, ...]} with one compact item per line.
+    
+    Used for spots/spaces/cameras when orjson is missing: json.dumps with
+    indent falls back to the pure-Python encoder, while items without
+    indent go through the C encoder several times faster.
+    """
+    if not items:
+        return f'{{\n  {_compact_encode(key)}: []\n}}'.encode('utf-8')
+    body = ',\n    '.join(map(_compact_encode, items))
+    return f'{{\n  {_compact_encode(key)}: [\n    {body}\n  ]\n}}'.encode('utf-8')
+
+
+def _dumps_compact(data: Any) -> bytes:
+    """Serialize data to single-line UTF-8 JSON bytes."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+    return _compact_encode(data).encode('utf-8')
+
+
+def _dumps(data: Any) -> bytes:
+    """Serialize data to indented UTF-8 JSON bytes."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            data,
+            option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        )
+    if isinstance(data, dict) and len(data) == 1:
+        (key, items), = data.items()
+        if isinstance(key, str) and isinstance(items, list):
+            return _dumps_list_document(key, items)
+    return json.dumps(data, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+def _loads(buf: bytes) -> Any:
+    """Parse JSON bytes."""
+    try:
+        if ORJSON_AVAILABLE:
+            return orjson.loads(buf)
+        return json.loads(buf)
+    except UnicodeDecodeError:
+        pass
+    except ValueError as e:
+        # orjson сообщает о битом UTF-8 как о JSONDecodeError
+        if 'utf-8' not in str(e).lower():
+            raise
+    # Старые файлы писались в текстовом режиме в кодировке системы
+    return json.loads(buf.decode(locale.getpreferredencoding(False)))
+
+
+# Схемы файлов по умолчанию
+_DEFAULTS = {
+    "config.json": {
+        "schema_version": 1,
+        "bot_token": "",
+        "allowed_chats": [],
+        "occupancy_minutes": 5,
+        "confidence_threshold": 0.5,
+        "update_hz": 1.0,
+        "streaming": {
+            "enabled": True,
+            "ffmpeg_path": "ffmpeg",
+            "targets": [],
+            "one_active_stream": True
+        }
+    },
+    "cameras.json": {"cameras": []},
+    "spaces.json": {"spaces": []},
+    "spots.json": {"spots": []},
+    "state.json": {
+        "spaces": {},
+        "active_stream": None
+    },
+    "markup_sessions.json": {"sessions": {}}
+}
+
+# Дефолтные файлы сериализуются один раз при импорте
+_DEFAULTS_BYTES: Dict[str, bytes] = {
+    filename: _dumps(default_data) for filename, default_data in _DEFAULTS.items()
+}
+
+
+class _FileLock:
+    """
+    Exclusive lock shared by threads and processes, backed by a lock file.
+    
+    The lock file descriptor is opened once and reused. flock/msvcrt locks
+    belong to the descriptor rather than to a thread, so threads of this
+    process are serialized by a regular threading.Lock first.
+    """
+    
+    def __init__(self, path: str, timeout: float = LOCK_TIMEOUT):
+        self.path = path
+        self.timeout = timeout
+        self._fd: Optional[int] = None
+        self._thread_lock = threading.Lock()
+    
+    def acquire(self):
+        deadline = time.monotonic() + self.timeout
+        if not self._thread_lock.acquire(timeout=self.timeout):
+            raise TimeoutError(f"Could not lock {self.path} within {self.timeout}s")
+        try:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            while True:
+                try:
+                    _try_lock(self._fd)
+                    return
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f"Could not lock {self.path} within {self.timeout}s")
+                    time.sleep(LOCK_POLL_INTERVAL)
+        except BaseException:
+            self._thread_lock.release()
+            raise
+    
+    def release(self):
+        try:
+            _unlock(self._fd)
+        finally:
+            self._thread_lock.release()
+    
+    def close(self):
+        with self._thread_lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+    
+    def __enter__(self):
+        self.acquire()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class _WriteCoalescer:
+    """
+    In-memory copy of a frequently updated file with deferred persistence.
+    
+    Updates only replace the in-memory snapshot; a background thread
+    persists the latest snapshot at most once per flush interval, so N
+    updates within the interval cost a single disk write.
+    
+    A flush appends only the difference from the previously flushed
+    snapshot to "<name>.patches" (one JSON list of set/del operations
+    per line). Every PATCH_COMPACT_EVERY patches, at startup and on close
+    the full document is rewritten and the log is reset. The log starts
+    with a header holding the inode of the file it applies to, so a log
+    left over from an interrupted compaction is ignored.
+    """
+    
+    def __init__(self, store: 'JSONStore', filepath: str, flush_interval: float):
+        self._store = store
+        self._filepath = filepath
+        self._flush_interval = flush_interval
+        self._log_path = filepath + PATCH_LOG_SUFFIX
+        self._log_fd: Optional[int] = os.open(
+            self._log_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644
+        )
+        self._patch_count = 0
+        
+        data = store._read_cached(filepath)
+        self._replay_patches(data)
+        self._compact(data)
+        # Последний записанный на диск снимок - база для следующего патча
+        self._flushed = data
+        
+        # Снимок хранится в pickle: каждый читатель получает свою копию
+        self._snapshot = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        # Разобранный снимок только для чтения (get_field), строится лениво
+        self._view: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._flush_loop, name=f"flush-{os.path.basename(filepath)}", daemon=True
+        )
+        self._thread.start()
+    
+    def read(self) -> Dict[str, Any]:
+        return pickle.loads(self._snapshot)
+    
+    def view(self) -> Dict[str, Any]:
+        """Shared parsed snapshot; callers must not mutate it."""
+        view = self._view
+        if view is None:
+            with self._lock:
+                if self._view is None:
+                    self._view = pickle.loads(self._snapshot)
+                view = self._view
+        return view
+    
+    def update(self, updater_func) -> Dict[str, Any]:
+        with self._lock:
+            updated_data = updater_func(pickle.loads(self._snapshot))
+            self._snapshot = pickle.dumps(updated_data, pickle.HIGHEST_PROTOCOL)
+            self._view = None
+            self._dirty.set()
+        return updated_data
+    
+    def write(self, data: Dict[str, Any]):
+        with self._lock:
+            self._snapshot = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+            self._view = None
+            self._dirty.set()
+    
+    def flush(self, compact: bool = False):
+        """Persist the latest snapshot if it changed since the last flush."""
+        with self._flush_lock:
+            if self._log_fd is None:
+                return
+            with self._lock:
+                dirty = self._dirty.is_set()
+                self._dirty.clear()
+                snapshot = self._snapshot
+            if not dirty and not (compact and self._patch_count):
+                return
+            
+            data = pickle.loads(snapshot)
+            try:
+                if compact or self._patch_count >= PATCH_COMPACT_EVERY:
+                    self._compact(data)
+                else:
+                    self._append_patch(data)
+                self._flushed = data
+            except Exception as e:
+                logger.error(f"Failed to flush {self._filepath}: {e}")
+                self._dirty.set()
+    
+    def close(self):
+        self._closed = True
+        self._dirty.set()
+        self._thread.join(timeout=5)
+        self.flush(compact=True)
+        with self._flush_lock:
+            if self._log_fd is not None:
+                os.close(self._log_fd)
+                self._log_fd = None
+    
+    def _append_patch(self, data: Dict[str, Any]):
+        ops: list = []
+        _diff_ops(self._flushed, data, [], ops)
+        if not ops:
+            return
+        os.write(self._log_fd, _dumps_compact(ops) + b"\n")
+        os.fsync(self._log_fd)
+        self._patch_count += 1
+    
+    def _compact(self, data: Dict[str, Any]):
+        """Rewrite the full document and start a new, empty patch log."""
+        self._store._write_atomic(self._filepath, data)
+        base = os.stat(self._filepath).st_ino
+        os.ftruncate(self._log_fd, 0)
+        os.write(self._log_fd, _dumps_compact({"base": base}) + b"\n")
+        os.fsync(self._log_fd)
+        self._patch_count = 0
+    
+    def _replay_patches(self, data: Dict[str, Any]):
+        """Apply patches left in the log by a previous run to data."""
+        with open(self._log_path, 'rb') as f:
+            lines = f.read().split(b"\n")
+        
+        try:
+            header = _loads(lines[0])
+            base = os.stat(self._filepath).st_ino
+        except (ValueError, OSError):
+            return
+        if not isinstance(header, dict) or header.get("base") != base:
+            return
+        
+        replayed = 0
+        for line in lines[1:]:
+            if not line:
+                continue
+            try:
+                ops = _loads(line)
+            except ValueError:
+                # Оборванная последняя запись - процесс упал во время записи
+                break
+            _apply_ops(data, ops)
+            replayed += 1
+        if replayed:
+            logger.info(f"Replayed {replayed} patches for {self._filepath}")
+    
+    def _flush_loop(self):
+        while not self._closed:
+            self._dirty.wait()
+            if self._closed:
+                break
+            # Даём накопиться обновлениям за интервал
+            time.sleep(self._flush_interval)
+            self.flush()
 
 
 class JSONStore:
     """Thread-safe JSON file storage with locking."""
     
-    def __init__(self, data_dir: str = "data"):
+    def __init__(self, data_dir: str = "data",
+                 coalesced_files: Iterable[str] = COALESCED_FILES,
+                 flush_interval: float = FLUSH_INTERVAL):
         self.data_dir = Path(data_dir)
         self.data_dir.mkdir(exist_ok=True)
         
-        # Default schemas
-        self.defaults = {
-            "config.json": {
-                "schema_version": 1,
-                "bot_token": "",
-                "allowed_chats": [],
-                "occupancy_minutes": 5,
-                "confidence_threshold": 0.5,
-                "update_hz": 1.0,
-                "streaming": {
-                    "enabled": True,
-                    "ffmpeg_path": "ffmpeg",
-                    "targets": [],
-                    "one_active_stream": True
-                }
-            },
-            "cameras.json": {"cameras": []},
-            "spaces.json": {"spaces": []},
-            "spots.json": {"spots": []},
-            "state.json": {
-                "spaces": {},
-                "active_stream": None
-            },
-            "markup_sessions.json": {"sessions": {}}
+        # Пути к файлам данных вычисляются один раз и хранятся строками:
+        # os.stat/open не тратят время на преобразование Path
+        self._paths: Dict[str, str] = {
+            filename: str(self.data_dir / filename) for filename in _DEFAULTS_BYTES
         }
         
+        # Per-file write versions so callers can cache derived data
+        self._write_counter = itertools.count(1)
+        self._versions: Dict[str, int] = {}
+        
+        # Кэш прочитанных файлов: path -> ((mtime_ns, size, inode), pickle-снимок).
+        # Запись в кэш сверяется с сигнатурой файла, поэтому устаревший снимок,
+        # положенный читателем параллельно с записью, не будет отдан повторно.
+        self._cache: Dict[str, Tuple[Tuple[int, int, int], bytes]] = {}
+        # Разобранные документы только для чтения: path -> (сигнатура, dict)
+        self._views: Dict[str, Tuple[Tuple[int, int, int], Dict[str, Any]]] = {}
+        self._cache_lock = nullcontext() if _ATOMIC_DICT_OPS else threading.Lock()
+        
+        # Блокировки записи по файлам (создаются лениво)
+        self._locks: Dict[str, _FileLock] = {}
+        
         # Initialize files if they don't exist
         self._init_files()
+        
+        self._coalescers: Dict[str, _WriteCoalescer] = {
+            filename: _WriteCoalescer(self, self._path(filename), flush_interval)
+            for filename in coalesced_files
+        }
+        if self._coalescers:
+            atexit.register(self.close)
     
     def _init_files(self):
-        """Create default JSON files if they don't exist."""
-        for filename, default_data in self.defaults.items():
-            filepath = self.data_dir / filename
-            if not filepath.exists():
-                self._write_atomic(filepath, default_data)
-    
-    def _write_atomic(self, filepath: Path, data: Dict[str, Any]):
-        """Write JSON atomically with exclusive lock."""
-        start_time = datetime.now()
+        """Create default JSON files if they don't exist and drop leftover temp files."""
+        for filename, payload in _DEFAULTS_BYTES.items():
+            filepath = self._paths[filename]
+            # Под блокировкой записи: чужой процесс может как раз писать свой temp-файл
+            with self._lock(filepath):
+                for tmp_path in self.data_dir.glob(f"{filename}.*{TMP_SUFFIX}"):
+                    try:
+                        tmp_path.unlink()
+                    except OSError:
+                        pass
+                
+                if not os.path.exists(filepath):
+                    self._replace_file(filepath, payload)
+    
+    def _path(self, filename: str) -> str:
+        """Path of a data file, computed once per filename."""
+        filepath = self._paths.get(filename)
+        if filepath is None:
+            filepath = self._paths.setdefault(filename, str(self.data_dir / filename))
+        return filepath
+    
+    def _invalidate(self, filepath: str):
+        """Drop cached contents of a file after it was written."""
+        with self._cache_lock:
+            self._cache.pop(filepath, None)
+            self._views.pop(filepath, None)
+    
+    def _lock(self, filepath: str) -> _FileLock:
+        """
+        Exclusive writer lock for a data file.
+        
+        The lock lives in a sidecar file because the data file itself is
+        replaced by rename on every write.
+        """
+        lock = self._locks.get(filepath)
+        if lock is None:
+            lock = self._locks.setdefault(filepath, _FileLock(filepath + LOCK_SUFFIX))
+        return lock
+    
+    def _replace_file(self, filepath: str, payload: bytes):
+        """
+        Write bytes to a temp file next to filepath and rename it into place.
+        
+        Nothing is written when the file already holds exactly these bytes:
+        a no-op update then costs a stat (and a read only if sizes match)
+        instead of a temp file, fsync and rename.
+        """
+        if _has_contents(filepath, payload):
+            return
+        
+        # Сохранить права существующего файла: rename переносит права temp-файла
         try:
-            with portalocker.Lock(str(filepath), 'w', timeout=2) as f:
-                json.dump(data, f, indent=2, ensure_ascii=False)
+            mode = stat.S_IMODE(os.stat(filepath).st_mode)
+        except FileNotFoundError:
+            mode = DEFAULT_FILE_MODE
+        
+        fd, tmp_name = tempfile.mkstemp(dir=self.data_dir, prefix=f"{os.path.basename(filepath)}.", suffix=TMP_SUFFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_name, mode)
+            _replace(tmp_name, filepath)
+        except BaseException:
+            try:
+                os.unlink(tmp_name)
+            except OSError:
+                pass
+            raise
+        self._invalidate(filepath)
+    
+    def _write_atomic(self, filepath: str, data: Dict[str, Any]):
+        """Write JSON atomically: serialize outside the lock, then rename into place."""
+        payload = _dumps(data)
+        
+        start_ns = time.perf_counter_ns()
+        try:
+            with self._lock(filepath):
+                self._replace_file(filepath, payload)
             
-            elapsed = (datetime.now() - start_time).total_seconds()
-            if elapsed > 0.5:
-                logger = logging.getLogger(__name__)
-                logger.warning(f"Slow write lock acquisition for {filepath}: {elapsed:.3f}s")
-        except portalocker.exceptions.LockException as e:
-            logger = logging.getLogger(__name__)
+            elapsed_ms = (time.perf_counter_ns() - start_ns) / 1_000_000
+            if elapsed_ms > SLOW_OPERATION_MS:
+                logger.warning(f"Slow write lock acquisition for {filepath}: {elapsed_ms:.1f}ms")
+        except TimeoutError as e:
             logger.error(f"Failed to acquire write lock for {filepath} after 2s: {e}")
             raise TimeoutError(f"Could not lock file {filepath} for writing")
     
-    def _read_locked(self, filepath: Path) -> Dict[str, Any]:
-        """Read JSON with shared lock."""
-        if not filepath.exists():
+    def _read_cached(self, filepath: str,
+                     signature: Optional[Tuple[int, int, int]] = None) -> Dict[str, Any]:
+        """
+        Read JSON, served from cache while the file is unchanged on disk.
+        
+        Every call returns a fresh object, so callers may mutate the result.
+        signature can be passed by callers that have just stat'ed the file.
+        """
+        if signature is None:
+            signature = _file_signature(filepath)
+            if signature is None:
+                return {}
+        
+        with self._cache_lock:
+            cached = self._cache.get(filepath)
+        if cached is not None and cached[0] == signature:
+            # pickle.loads заметно быстрее и deepcopy, и json.load
+            return pickle.loads(cached[1])
+        
+        loaded = self._load(filepath)
+        if loaded is None:
+            return {}
+        signature, result = loaded
+        with self._cache_lock:
+            self._cache[filepath] = (signature, pickle.dumps(result, pickle.HIGHEST_PROTOCOL))
+        return result
+    
+    def _read_view(self, filepath: str) -> Dict[str, Any]:
+        """Shared parsed document for read-only access; callers must not mutate it."""
+        signature = _file_signature(filepath)
+        if signature is None:
             return {}
         
-        start_time = datetime.now()
+        with self._cache_lock:
+            view = self._views.get(filepath)
+        if view is not None and view[0] == signature:
+            return view[1]
+        
+        data = self._read_cached(filepath, signature)
+        with self._cache_lock:
+            self._views[filepath] = (signature, data)
+        return data
+    
+    def _load(self, filepath: str) -> Optional[Tuple[Tuple[int, int, int], Dict[str, Any]]]:
+        """
+        Read JSON from disk, returning the file signature with the data.
+        
+        No lock is needed: writers replace the file by rename, so a reader
+        always sees either the old or the new complete document.
+        """
         try:
-            with portalocker.Lock(str(filepath), 'r', timeout=2) as f:
-                result = json.load(f)
-            
-            elapsed = (datetime.now() - start_time).total_seconds()
-            if elapsed > 0.5:
-                logger = logging.getLogger(__name__)
-                logger.warning(f"Slow read lock acquisition for {filepath}: {elapsed:.3f}s")
-            
-            return result
-        except portalocker.exceptions.LockException as e:
-            logger = logging.getLogger(__name__)
-            logger.error(f"Failed to acquire read lock for {filepath} after 2s: {e}")
-            raise TimeoutError(f"Could not lock file {filepath} for reading")
+            with open(filepath, 'rb') as f:
+                result = _loads(f.read())
+                st = os.fstat(f.fileno())
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino), result
     
     def read(self, filename: str) -> Dict[str, Any]:
         """Read JSON file."""
-        filepath = self.data_dir / filename
-        return self._read_locked(filepath)
+        coalescer = self._coalescers.get(filename)
+        if coalescer is not None:
+            return coalescer.read()
+        filepath = self._path(filename)
+        return self._read_cached(filepath)
+    
+    def read_view(self, filename: str) -> Dict[str, Any]:
+        """
+        Read JSON file without copying it.
+        
+        The returned document is shared between callers and must not be
+        modified; use read() to get a private copy.
+        """
+        coalescer = self._coalescers.get(filename)
+        if coalescer is not None:
+            return coalescer.view()
+        return self._read_view(self._path(filename))
+    
+    def get_field(self, filename: str, key: str, default: Any = None) -> Any:
+        """
+        Read one top-level field without copying the whole document.
+        
+        Only the returned value is copied (and only if it is a container),
+        so reading a scalar like state["active_stream"] is a dict lookup.
+        """
+        value = self.read_view(filename).get(key, default)
+        if isinstance(value, (dict, list)):
+            return pickle.loads(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        return value
+    
+    def read_raw(self, filename: str) -> Dict[str, Any]:
+        """Read JSON file straight from disk, bypassing the cache."""
+        loaded = self._load(self._path(filename))
+        return loaded[1] if loaded is not None else {}
     
     def write(self, filename: str, data: Dict[str, Any]):
         """Write JSON file atomically."""
-        filepath = self.data_dir / filename
-        self._write_atomic(filepath, data)
+        coalescer = self._coalescers.get(filename)
+        if coalescer is not None:
+            coalescer.write(data)
+        else:
+            self._write_atomic(self._path(filename), data)
+        self._versions[filename] = next(self._write_counter)
     
     def update(self, filename: str, updater_func):
         """Update JSON file atomically with a function."""
-        filepath = self.data_dir / filename
+        coalescer = self._coalescers.get(filename)
+        if coalescer is not None:
+            updated_data = coalescer.update(updater_func)
+            self._versions[filename] = next(self._write_counter)
+            return updated_data
         
-        start_time = datetime.now()
+        filepath = self._path(filename)
+        
+        start_ns = time.perf_counter_ns()
         try:
-            with portalocker.Lock(str(filepath), 'r+', timeout=2) as f:
-                data = json.load(f)
+            with self._lock(filepath):
+                data = self._read_cached(filepath)
                 updated_data = updater_func(data)
-                f.seek(0)
-                f.truncate()
-                json.dump(updated_data, f, indent=2, ensure_ascii=False)
+                self._replace_file(filepath, _dumps(updated_data))
+            self._versions[filename] = next(self._write_counter)
             
-            elapsed = (datetime.now() - start_time).total_seconds()
-            if elapsed > 0.5:
-                logger = logging.getLogger(__name__)
-                logger.warning(f"Slow update lock acquisition for {filepath}: {elapsed:.3f}s")
+            elapsed_ms = (time.perf_counter_ns() - start_ns) / 1_000_000
+            if elapsed_ms > SLOW_OPERATION_MS:
+                logger.warning(f"Slow update lock acquisition for {filepath}: {elapsed_ms:.1f}ms")
             
             return updated_data
-        except portalocker.exceptions.LockException as e:
-            logger = logging.getLogger(__name__)
+        except TimeoutError as e:
             logger.error(f"Failed to acquire update lock for {filepath} after 2s: {e}")
             raise TimeoutError(f"Could not lock file {filepath} for updating")
     
+    def flush(self):
+        """Write pending in-memory updates to disk."""
+        for coalescer in self._coalescers.values():
+            coalescer.flush()
+    
+    def close(self):
+        """Flush pending updates, stop background writers and release lock files."""
+        for coalescer in self._coalescers.values():
+            coalescer.close()
+        for lock in self._locks.values():
+            lock.close()
+    
+    def get_version(self, filename: str) -> Tuple[int, Optional[Tuple[int, int, int]]]:
+        """
+        Return a token that changes whenever the file changes.
+        
+        Combines the in-process write counter with the on-disk
+        (mtime_ns, size, inode) signature, so edits made outside this
+        store (by hand, by another process) are noticed as well.
+        """
+        return self._versions.get(filename, 0), _file_signature(self._path(filename))
+    
     # Convenience methods for specific files
     def get_config(self) -> Dict[str, Any]:
         return self.read("config.json")
@@ -138,19 +736,19 @@ class JSONStore:
         return self.read("cameras.json").get("cameras", [])
     
     def save_cameras(self, cameras: list):
-        self.write("cameras.json", {"cameras": cameras})
+        return self.update("cameras.json", lambda data: {**data, "cameras": cameras})
     
     def get_spaces(self) -> list:
         return self.read("spaces.json").get("spaces", [])
     
     def save_spaces(self, spaces: list):
-        self.write("spaces.json", {"spaces": spaces})
+        return self.update("spaces.json", lambda data: {**data, "spaces": spaces})
     
     def get_spots(self) -> list:
         return self.read("spots.json").get("spots", [])
     
     def save_spots(self, spots: list):
-        self.write("spots.json", {"spots": spots})
+        return self.update("spots.json", lambda data: {**data, "spots": spots})
     
     def get_state(self) -> Dict[str, Any]:
         return self.read("state.json")
@@ -158,9 +756,16 @@ class JSONStore:
     def update_state(self, updater_func):
         return self.update("state.json", updater_func)
     
-    def get_markup_sessions(self) -> Dict[str, any]:
+    def get_state_view(self) -> Dict[str, Any]:
+        """Shared read-only state snapshot (see read_view)."""
+        return self.read_view("state.json")
+    
+    def get_active_stream(self) -> Optional[Dict[str, Any]]:
+        return self.get_field("state.json", "active_stream")
+    
+    def get_markup_sessions(self) -> Dict[str, Any]:
         return self.read("markup_sessions.json").get("sessions", {})
     
-    def save_markup_sessions(self, sessions: Dict):
-        self.write("markup_sessions.json", {"sessions": sessions})
+    def save_markup_sessions(self, sessions: Dict[str, Any]):
+        return self.update("markup_sessions.json", lambda data: {**data, "sessions": sessions})
 
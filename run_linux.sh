@@ -53,5 +53,5 @@ echo "  Starting Parking Monitor..."
 echo "========================================"
 echo ""
 
-python3 backend/app.py --host 0.0.0.0 --port 5000
+python3 -m backend --host 0.0.0.0 --port 5000
 
@@ -51,5 +51,5 @@ Write-Host "  Starting Parking Monitor..." -ForegroundColor Cyan
 Write-Host "========================================" -ForegroundColor Cyan
 Write-Host ""
 
-python backend/app.py --host 0.0.0.0 --port 5000
+python -m backend --host 0.0.0.0 --port 5000
 